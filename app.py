@@ -1,8 +1,32 @@
-import cohere
+import startup_timing
+startup_timing.start_run()
 import streamlit as st
-import pandas as pd
-from datetime import datetime
-import plotly.express as px
+from streamlit.errors import StreamlitAPIException
+import cProfile
+import hashlib
+import io
+import os
+import pstats
+import re
+import secrets
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import planner
+from plan_cache import PlanCache
+from plan_index import PlanIndex
+from progress_store import ProgressStore
+from chat_context import ChatContext
+from meal_plan import format_meal_plan, parse_meal_plan
+from nutrition import (apply_nutrition, compute_plan_nutrition, format_nutrition, format_violations,
+                       get_screener, load_nutrition_db)
+from llm_backends import create_backend
+from llm_gateway import LLMGateway
+from metrics import MetricsRegistry
+from transcript_store import TranscriptStore, approximate_size
+# pandas and plotly are imported by the Progress tab the first time it has data to show
+startup_timing.mark("imports")
 
 # ----------------------------------------------------------------
 # Set Page Configuration 
@@ -40,11 +64,193 @@ st.sidebar.info(
 )
 
 # ----------------------------------------------------------------
-# 1. Load Cohere API Key and Initialize Client
+# 1. Initialize the LLM Gateway
 # ----------------------------------------------------------------
-with open("cohere.key") as f:
-    COHERE_API_KEY = f.read().strip()
-co = cohere.Client(COHERE_API_KEY)
+@st.cache_resource
+def get_llm_gateway():
+    """
+    Returns the process-wide LLM gateway, created once per server process rather than per script run.
+    The backend is chosen with the LLM_BACKEND environment variable ("cohere" or "mock"); with
+    LLM_RECORDING_PATH set, Cohere responses are recorded to that file and the mock replays them.
+    """
+    return LLMGateway(create_backend(), metrics=get_metrics())
+
+@st.cache_resource
+def get_metrics():
+    """
+    Returns the process-wide metrics registry. Metrics are written in Prometheus text format to
+    METRICS_PATH (default metrics.prom) and, if METRICS_PORT is set, served at :METRICS_PORT/metrics.
+    """
+    metrics = MetricsRegistry()
+    if os.environ.get("METRICS_PORT"):
+        metrics.serve(int(os.environ["METRICS_PORT"]))
+    return metrics
+
+# Minimum seconds between metrics file writes
+METRICS_WRITE_INTERVAL = 10
+
+def export_metrics():
+    try:
+        get_metrics().write(os.environ.get("METRICS_PATH", "metrics.prom"), min_interval=METRICS_WRITE_INTERVAL)
+    except OSError:
+        # Metrics are diagnostic only; an unwritable path must not break the page
+        pass
+
+def section_timer(section):
+    """
+    Times one page section per run into the app_section_render_seconds histogram.
+    """
+    return get_metrics().time("app_section_render_seconds", "Wall time of one page section per run", section=section)
+
+@contextmanager
+def session_profiler():
+    """
+    Profiles the script run with cProfile while "Profile this session" is on. Stats accumulate
+    in the session across reruns and are shown in the sidebar.
+    """
+    if not st.session_state.get("profile_session"):
+        yield
+        return
+    profiler = st.session_state.setdefault("session_profiler", cProfile.Profile())
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+def render_profile_stats(limit=25):
+    profiler = st.session_state.get("session_profiler")
+    if profiler is None:
+        st.caption("No profiled runs yet; interact with the app and come back.")
+        return
+    buffer = io.StringIO()
+    try:
+        pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(limit)
+    except TypeError:
+        # pstats cannot load a profiler that has not recorded anything yet
+        st.caption("No profiled runs yet; interact with the app and come back.")
+        return
+    st.code(buffer.getvalue(), language=None)
+    if st.button("Reset profile", key="reset_profile"):
+        del st.session_state["session_profiler"]
+
+@st.cache_resource
+def get_plan_cache():
+    """
+    Returns the process-wide plan cache shared by all sessions.
+    """
+    return PlanCache("plan_cache.sqlite3")
+
+@st.cache_resource
+def get_plan_index():
+    """
+    Returns the process-wide index of generated meal plans used to serve similar profiles.
+    The similarity needed for reuse is set with PLAN_REUSE_THRESHOLD (0-1, default 0.85).
+    """
+    return PlanIndex("plan_index.sqlite3", threshold=float(os.environ.get("PLAN_REUSE_THRESHOLD", 0.85)))
+
+@st.cache_resource
+def get_nutrition_db():
+    """
+    Returns the bundled food composition table, loaded once per server process.
+    """
+    return load_nutrition_db()
+
+@st.cache_resource
+def get_progress_store():
+    """
+    Returns the process-wide store of profile measurements.
+    """
+    return ProgressStore("progress.sqlite3")
+
+# (body shape, image file, select button key) for the Profile tab
+BODY_SHAPES = [
+    ("Apple", "image/apple.png", "select_apple"),
+    ("Pear", "image/pear.png", "select_pear"),
+    ("Hourglass", "image/hourglass.png", "select_hourglass"),
+    ("Rectangle", "image/rectangle.png", "select_rectangle"),
+    ("Inverted Triangle", "image/inverted-triangle.png", "select_inverted"),
+]
+# Each image fills one of five columns, so a 200 px wide copy is sharp enough
+BODY_SHAPE_IMAGE_WIDTH = 200
+
+@st.cache_resource
+def body_shape_images(width=BODY_SHAPE_IMAGE_WIDTH):
+    """
+    Returns the body-shape images resized to `width` and encoded as PNG bytes, decoded once per process.
+    """
+    from PIL import Image
+
+    images = {}
+    for shape, path, _ in BODY_SHAPES:
+        with Image.open(path) as image:
+            image.thumbnail((width, width * image.height // image.width))
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", optimize=True)
+        images[shape] = buffer.getvalue()
+    return images
+
+@st.cache_resource
+def get_transcript_store():
+    """
+    Returns the process-wide store that keeps chat transcripts within their memory caps.
+    """
+    return TranscriptStore(metrics=get_metrics())
+
+def current_session_id():
+    return st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
+def session_footprint():
+    """
+    Returns the approximate bytes this session holds in memory and the footprint of its transcripts.
+    """
+    in_memory = sum(approximate_size(value) for value in st.session_state.to_dict().values())
+    return in_memory, get_transcript_store().session_footprint(current_session_id())
+
+# Progress keys are random tokens (secrets.token_urlsafe(16) or longer)
+PROGRESS_KEY_PATTERN = re.compile(r"[A-Za-z0-9_-]{22,}")
+
+def progress_key():
+    """
+    Returns the session's progress key: a random token that is the only credential for the user's
+    stored measurements. A new session gets a fresh key unless the user restores an earlier one.
+    """
+    return st.session_state.setdefault("progress_key", secrets.token_urlsafe(16))
+
+def current_user_id():
+    """
+    Returns the id progress is stored under, derived from the progress key. Only a hash is stored,
+    so the database does not hold usable keys.
+    """
+    return "user-" + hashlib.sha256(progress_key().encode("utf-8")).hexdigest()[:32]
+
+def restore_progress_key():
+    key = st.session_state.get("restore_progress_key", "").strip()
+    if PROGRESS_KEY_PATTERN.fullmatch(key):
+        st.session_state["progress_key"] = key
+        st.session_state["restore_progress_key"] = ""
+    else:
+        st.session_state["progress_key_error"] = "That does not look like a progress key."
+
+def render_progress_key():
+    """
+    Shows the session's progress key and lets the user restore the key of an earlier session.
+    """
+    with st.expander("Your progress key"):
+        st.caption(
+            "Your measurements are saved under this key. Copy it to continue your history in a later session, "
+            "and keep it private: anyone with the key can see and add to your measurements."
+        )
+        st.code(progress_key(), language=None)
+        st.text_input("Continue with an earlier key", key="restore_progress_key", type="password")
+        st.button("Use this key", key="use_progress_key", on_click=restore_progress_key)
+        if "progress_key_error" in st.session_state:
+            st.error(st.session_state.pop("progress_key_error"))
 
 # ----------------------------------------------------------------
 # 2. LLM Utility Functions
@@ -54,149 +260,286 @@ def generate_weekly_meal_plan(user_profile):
     """
     Generates an initial 7-day meal plan based on user profile.
     """
-    prompt = f"""
-    You are a nutrition expert. Generate a 7-day meal plan for the following user profile:
-    
-    - Gender: {user_profile['gender']}
-    - Body Shape: {user_profile['body_shape']}
-    - Height (cm): {user_profile['height']}
-    - Current Weight (kg): {user_profile['current_weight']}
-    - Goal Weight (kg): {user_profile['goal_weight']}
-    - Waist Circumference (cm): {user_profile['waist_circumference']}
-    - Hip Circumference (cm): {user_profile['hip_circumference']}
-    - Dietary Restrictions: {user_profile['dietary_restrictions']}
-    - Nutritional Goal: {user_profile['nutritional_goal']}
-    - Ingredient Preferences: {user_profile['ingredient_preferences']}
-    - Allergies: {user_profile['allergies']}
-    
-    The meal plan should have 3 meals + 2 snacks per day (Breakfast, Snack, Lunch, Snack, Dinner).
-    Return the plan in a JSON-like structure with a 'Total Daily Calories' estimate for each day.
-    """
-    response = co.generate(
-        model="command-xlarge",
-        prompt=prompt,
-        max_tokens=2000,
-        temperature=0.7
-    )
-    return response.generations[0].text.strip()
+    return planner.generate_weekly_meal_plan(user_profile, get_llm_gateway(), get_plan_cache(), get_plan_index())
 
-def chat_meal_plan(conversation):
+def adopt_meal_plan(text):
     """
-    Uses the conversation history (including the profile info) to generate the next AI reply.
+    Parses meal plan text into the session's structured plan.
+    Only complete plans replace the current one (a reply discussing a single meal does not).
+    Returns the parsed plan or None.
+    """
+    plan = parse_meal_plan(text)
+    current = st.session_state.get("meal_plan_model")
+    if plan is None or (current is not None and len(plan.days) < len(current.days)):
+        return None
+    # Calories come from the food table wherever it covers the meal, not from the LLM's estimate
+    st.session_state["meal_plan_model"] = apply_nutrition(plan, compute_plan_nutrition(plan, get_nutrition_db()))
+    return plan
+
+def diet_screener():
+    """
+    Returns the allergen and dietary restriction screener for the session's profile.
     """
     profile = st.session_state.get("user_profile", {})
-    prompt = "You are a nutrition expert and conversational AI. Use the following user profile to inform your responses:\n"
-    if profile:
-        prompt += (
-            f"- Gender: {profile.get('gender', '')}\n"
-            f"- Body Shape: {profile.get('body_shape', '')}\n"
-            f"- Height (cm): {profile.get('height', '')}\n"
-            f"- Current Weight (kg): {profile.get('current_weight', '')}\n"
-            f"- Goal Weight (kg): {profile.get('goal_weight', '')}\n"
-            f"- Waist Circumference (cm): {profile.get('waist_circumference', '')}\n"
-            f"- Hip Circumference (cm): {profile.get('hip_circumference', '')}\n"
-            f"- Dietary Restrictions: {profile.get('dietary_restrictions', '')}\n"
-            f"- Nutritional Goal: {profile.get('nutritional_goal', '')}\n"
-            f"- Ingredient Preferences: {profile.get('ingredient_preferences', '')}\n"
-            f"- Allergies: {profile.get('allergies', '')}\n\n"
-        )
-    prompt += "The following is a conversation between a user and you about generating a meal plan.\n"
-    for msg in conversation:
-        if msg["role"] == "user":
-            prompt += "User: " + msg["message"] + "\n"
-        else:
-            prompt += "AI: " + msg["message"] + "\n"
-    prompt += "AI:"
-    response = co.generate(
-        model="command-xlarge",
-        prompt=prompt,
-        max_tokens=2000,
-        temperature=0.7
-    )
-    return response.generations[0].text.strip()
+    return get_screener(get_nutrition_db(), profile.get("allergies", ""), profile.get("dietary_restrictions", ""))
+
+def screening_note(plan):
+    """
+    Returns the allergen and restriction warnings for a newly adopted plan, to append to the reply.
+    """
+    violations = diet_screener().screen(plan)
+    return "\n\n" + format_violations(violations) if violations else ""
+
+def _adopt_streamed_meal_plan(chunks):
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    # Only reached when the stream completes, so an interrupted reply never replaces the plan
+    plan = adopt_meal_plan("".join(parts))
+    if plan is not None:
+        yield screening_note(plan)
+
+def _single_chunk(text):
+    yield text
+
+def chat_meal_plan(conversation, stream=False):
+    """
+    Generates the next meal chatbot reply using the session's profile and conversation context.
+    Requests that target one day or meal of the structured plan regenerate only that part.
+    """
+    context = st.session_state.setdefault("meal_context", ChatContext())
+    profile = st.session_state.get("user_profile", {})
+    plan = st.session_state.get("meal_plan_model")
+    if plan is not None:
+        refined = planner.refine_meal_plan(plan, conversation[-1]["message"], profile, get_llm_gateway(),
+                                           get_nutrition_db())
+        if refined is not None:
+            st.session_state["meal_plan_model"], reply = refined
+            # Only conflicts introduced by this edit; earlier ones were already reported
+            previous = set(diet_screener().screen(plan))
+            introduced = [v for v in diet_screener().screen(refined[0]) if v not in previous]
+            if introduced:
+                reply += "\n\n" + format_violations(introduced)
+            return _single_chunk(reply) if stream else reply
+    # Send the up-to-date structured plan rather than the (possibly edited) original message
+    plan_text = format_meal_plan(plan) if plan is not None else None
+    reply = planner.chat_meal_plan(conversation, profile, context, get_llm_gateway(), stream=stream,
+                                   plan_text=plan_text)
+    if stream:
+        return _adopt_streamed_meal_plan(reply)
+    plan = adopt_meal_plan(reply)
+    if plan is not None:
+        reply += screening_note(plan)
+    return reply
 
 def generate_workout_plan(user_profile, workout_prefs):
-    prompt = f"""
-    You are a personal fitness coach. Based on the following user profile and workout preferences,
-    generate a 7-day workout plan. **Do not exceed {workout_prefs['days_per_week']} workout days.**
-    For the remaining {7 - workout_prefs['days_per_week']} days, label them as "Rest Day" or
-    "Active Recovery" days.
-
-    User Profile:
-    - Gender: {user_profile['gender']}
-    - Body Shape: {user_profile['body_shape']}
-    - Height (cm): {user_profile['height']}
-    - Current Weight (kg): {user_profile['current_weight']}
-    - Goal Weight (kg): {user_profile['goal_weight']}
-
-    Workout Preferences:
-    - Days per week: {workout_prefs['days_per_week']}
-    - Workout Style: {workout_prefs['workout_style']}
-    - Equipment Available: {workout_prefs['equipment']}
-    - Workout Location: {workout_prefs['location']}
-    - Session Duration (minutes): {workout_prefs['session_duration']}
-    - Other Notes: {workout_prefs['other_workout_notes']}
-
-    Return the plan in a structured format, for example:
-
-    Day 1:
-      - Warm-up:
-      - Main Workout:
-      - Cool-down:
-    Day 2:
-      ...
-    ...
-    Day 7:
-      ...
-
-    **Important**: You must provide exactly {workout_prefs['days_per_week']} workout days. The remaining days must be labeled as rest or active recovery.
-    """
-    response = co.generate(
-        model="command-xlarge",
-        prompt=prompt,
-        max_tokens=2000,
-        temperature=0.7
-    )
-    return response.generations[0].text.strip()
+    """
+    Generates an initial 7-day workout plan based on the user profile and workout preferences.
+    """
+    return planner.generate_workout_plan(user_profile, workout_prefs, get_llm_gateway(), get_plan_cache())
 
-def chat_workout_plan(conversation):
+def chat_workout_plan(conversation, stream=False):
     """
-    Uses the conversation history (including user profile + workout prefs) to generate the next AI reply.
+    Generates the next workout chatbot reply using the session's profile, workout prefs and conversation context.
     """
+    context = st.session_state.setdefault("workout_context", ChatContext())
     profile = st.session_state.get("user_profile", {})
     workout_prefs = st.session_state.get("workout_prefs", {})
-    prompt = "You are a personal fitness coach and a conversational AI. Use the following user profile and workout preferences:\n"
-    if profile:
-        prompt += (
-            f"- Gender: {profile.get('gender', '')}\n"
-            f"- Body Shape: {profile.get('body_shape', '')}\n"
-            f"- Height (cm): {profile.get('height', '')}\n"
-            f"- Current Weight (kg): {profile.get('current_weight', '')}\n"
-            f"- Goal Weight (kg): {profile.get('goal_weight', '')}\n"
-        )
-    if workout_prefs:
-        prompt += (
-            f"- Days per week: {workout_prefs.get('days_per_week', '')}\n"
-            f"- Workout Style: {workout_prefs.get('workout_style', '')}\n"
-            f"- Equipment: {workout_prefs.get('equipment', '')}\n"
-            f"- Location: {workout_prefs.get('location', '')}\n"
-            f"- Session Duration: {workout_prefs.get('session_duration', '')} min\n"
-            f"- Other Notes: {workout_prefs.get('other_workout_notes', '')}\n\n"
-        )
-    prompt += "The following is a conversation between a user and you about generating or refining a workout plan.\n"
-    for msg in conversation:
-        if msg["role"] == "user":
-            prompt += "User: " + msg["message"] + "\n"
+    return planner.chat_workout_plan(conversation, profile, workout_prefs, context, get_llm_gateway(), stream=stream)
+
+@st.cache_resource
+def get_plan_executor():
+    """
+    Returns the process-wide thread pool used to generate initial plans in the background.
+    """
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="plan-prefetch")
+
+def prefetch_plans(user_profile, workout_prefs=None):
+    """
+    Starts generating any initial plans the session does not have yet.
+    The meal and workout plans run concurrently; their futures are kept in session state.
+    Plans whose last generation failed are only restarted by retry_plan or a new profile save.
+    """
+    futures = st.session_state.setdefault("plan_futures", {})
+    errors = st.session_state.get("plan_errors", {})
+    executor = get_plan_executor()
+    if "meal_chat" not in st.session_state and "meal" not in futures and "meal" not in errors:
+        futures["meal"] = executor.submit(generate_weekly_meal_plan, user_profile)
+    if (workout_prefs and "workout_chat" not in st.session_state and "workout" not in futures
+            and "workout" not in errors):
+        futures["workout"] = executor.submit(generate_workout_plan, user_profile, workout_prefs)
+
+def collect_plan(kind, chat_key):
+    """
+    Moves a finished background plan into the `chat_key` conversation.
+    Returns True once the conversation exists, False while the plan is pending or after it failed.
+    """
+    if chat_key in st.session_state:
+        return True
+    futures = st.session_state.get("plan_futures", {})
+    future = futures.get(kind)
+    if future is None or not future.done():
+        return False
+    del futures[kind]
+    try:
+        plan = future.result()
+    except Exception as e:
+        # Kept until the user retries, so a persistent failure is not resubmitted on every run
+        st.session_state.setdefault("plan_errors", {})[kind] = str(e)
+        return False
+    if kind == "meal":
+        meal_plan = adopt_meal_plan(plan)
+        if meal_plan is not None:
+            # Show the compact structured form; it is also what later prompts and edits work from
+            plan = format_meal_plan(meal_plan)
+            plan += "\n\n" + format_nutrition(meal_plan, compute_plan_nutrition(meal_plan, get_nutrition_db()))
+            plan += screening_note(meal_plan)
         else:
-            prompt += "AI: " + msg["message"] + "\n"
-    prompt += "AI:"
-    response = co.generate(
-        model="command-xlarge",
-        prompt=prompt,
-        max_tokens=2000,
-        temperature=0.7
+            conflicts = diet_screener().screen_text(plan)
+            if conflicts:
+                terms = ", ".join(sorted({f"{term} ({reason})" for term, reason in conflicts}))
+                plan += f"\n\n**Please check: this plan mentions {terms}.**"
+    st.session_state[chat_key] = get_transcript_store().transcript(
+        current_session_id(), kind, [{"role": "assistant", "message": plan}]
     )
-    return response.generations[0].text.strip()
+    return True
+
+def plan_failed(kind):
+    """
+    Shows the error of a failed background plan with a button to retry it.
+    Returns True if the plan failed.
+    """
+    error = st.session_state.get("plan_errors", {}).get(kind)
+    if error is None:
+        return False
+    st.error(f"Could not generate your {kind} plan: {error}")
+    if st.button("Retry", key=f"retry_{kind}_plan"):
+        del st.session_state["plan_errors"][kind]
+        prefetch_plans(st.session_state["user_profile"], st.session_state.get("workout_prefs"))
+        st.rerun()
+    return True
+
+@st.fragment(run_every=1)
+def plan_pending_notice(kind):
+    """
+    Shows a pending state for a background plan and reruns the app once it is ready.
+    """
+    future = st.session_state.get("plan_futures", {}).get(kind)
+    if future is None or future.done():
+        st.rerun()
+    st.info(f"Generating your {kind} plan... you can keep using the other tabs in the meantime.")
+
+def render_streamed_reply(placeholder, chunks):
+    """
+    Renders streamed text chunks into `placeholder` as they arrive and returns the complete reply.
+    """
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            placeholder.markdown(f"**AI:** {''.join(parts).lstrip()}▌")
+    finally:
+        chunks.close()
+    reply = "".join(parts).strip()
+    placeholder.markdown(f"**AI:** {reply}")
+    return reply
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_progress_view(user_id, history_version, start, max_points):
+    """
+    Loads the selected window of measurements, derives BMI and builds the progress figure.
+    Memoized on `history_version` (the user's measurement count), so reruns skip all of it
+    until a new measurement is saved.
+    """
+    with startup_timing.measure("import progress_charts"):
+        from progress_charts import add_derived_metrics, build_progress_figure
+    with section_timer("progress_query"):
+        history_df = add_derived_metrics(get_progress_store().query(user_id, start=start))
+    with section_timer("progress_figure"):
+        progress_fig = build_progress_figure(history_df, max_points=max_points)
+    return history_df, progress_fig
+
+def rerun_section():
+    """
+    Reruns only the current fragment, or the whole app if the fragment is executing as part of a full run.
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+# Messages shown per page of a chat transcript
+TRANSCRIPT_PAGE_SIZE = 10
+
+def render_transcript(chat_key):
+    """
+    Renders the most recent page of a conversation, with a button that loads older messages on demand.
+    Pages beyond the transcript's in-memory window are read back from disk.
+    """
+    messages = st.session_state[chat_key]
+    visible_key = f"{chat_key}_visible"
+    visible = st.session_state.get(visible_key, TRANSCRIPT_PAGE_SIZE)
+    hidden = max(0, len(messages) - visible)
+    if hidden and st.button(f"Show older messages ({hidden} hidden)", key=f"{chat_key}_older"):
+        st.session_state[visible_key] = visible + TRANSCRIPT_PAGE_SIZE
+        rerun_section()
+    for msg in messages[hidden:]:
+        if msg["role"] == "user":
+            st.markdown(f"**You:** {msg['message']}")
+        else:
+            st.markdown(f"**AI:** {msg['message']}")
+
+@st.fragment
+def chat_section(name, chat_fn):
+    """
+    The transcript and input of one chatbot ("meal" or "workout").
+    Runs as a fragment, so sending a message reruns only this section instead of the whole app.
+    """
+    with section_timer(f"{name}_chat"):
+        render_chat(name, chat_fn)
+
+def render_chat(name, chat_fn):
+    chat_key, context_key = f"{name}_chat", f"{name}_context"
+    st.markdown("### Conversation")
+    # Display the latest page of the conversation history
+    render_transcript(chat_key)
+
+    if context_key in st.session_state and st.session_state[context_key].prompt_log:
+        prompt_stats = st.session_state[context_key].stats()
+        st.caption(
+            f"Last prompt: ~{prompt_stats['last_prompt_tokens']} tokens · "
+            f"~{prompt_stats['tokens_saved']} tokens saved this session versus resending the full history"
+        )
+
+    # User input for chat
+    user_input = st.text_input("Type your message here:", key=f"{name}_input")
+    if st.button("Send", key=f"{name}_send") and user_input:
+        # The turn is only committed to the history once the full reply is available,
+        # so an interrupted stream leaves the conversation unchanged.
+        transcript = st.session_state[chat_key]
+        user_message = {"role": "user", "message": user_input}
+        conversation = transcript.extended([user_message])
+        # Generate AI response
+        if st.session_state.get("stream_responses", True):
+            st.markdown(f"**You:** {user_input}")
+            ai_response = render_streamed_reply(st.empty(), chat_fn(conversation, stream=True))
+        else:
+            ai_response = chat_fn(conversation)
+        transcript.append(user_message)
+        transcript.append({"role": "assistant", "message": ai_response})
+        rerun_section()
+
+# Points per chart series when downsampling long histories
+PROGRESS_MAX_POINTS = 500
+
+# Time ranges offered in the Progress tab (None loads the full history)
+PROGRESS_TIME_RANGES = {
+    "Last 30 days": timedelta(days=30),
+    "Last 90 days": timedelta(days=90),
+    "Last year": timedelta(days=365),
+    "All time": None,
+}
 
 # ----------------------------------------------------------------
 # 3. Streamlit App with Four Tabs: "Profile", "Meal Plan", "Workout Plan", and "Progress"
@@ -204,6 +547,28 @@ def chat_workout_plan(conversation):
 def main():
     st.title("Advanced Health & Fitness Planner")
 
+    st.sidebar.toggle("Stream AI responses", value=True, key="stream_responses")
+    cache_stats = get_plan_cache().stats()
+    st.sidebar.caption(
+        f"Plan cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, "
+        f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate)"
+    )
+    reuse_stats = get_plan_index().stats()
+    st.sidebar.caption(
+        f"Similar-profile reuse: {reuse_stats['reused'] + reuse_stats['adapted']} of {reuse_stats['lookups']} "
+        f"meal plans ({reuse_stats['reuse_rate']:.0%}), {reuse_stats['adapted']} adapted"
+    )
+    with st.sidebar.expander("Diagnostics"):
+        st.toggle("Profile this session (cProfile)", key="profile_session")
+        if st.session_state.get("profile_session"):
+            render_profile_stats()
+        in_memory, transcripts = session_footprint()
+        st.caption(
+            f"Session memory: ~{in_memory / 1024:.0f} KB. Chat history: {transcripts['memory_messages']} "
+            f"messages in memory, {transcripts['disk_messages']} on disk ({transcripts['disk_bytes'] / 1024:.0f} KB "
+            f"compressed)"
+        )
+
     # Create four tabs: Profile, Meal Plan, Workout Plan, and Progress
     tab_profile, tab_mealplan, tab_workout, tab_progress = st.tabs(
         ["Profile", "Meal Plan", "Workout Plan", "Progress"]
@@ -212,32 +577,19 @@ def main():
     # -------------------------
     # Tab 1: User Profile
     # -------------------------
-    with tab_profile:
+    with tab_profile, section_timer("profile"):
         st.subheader("Select Your Body Shape")
-        cols = st.columns(5)
-        with cols[0]:
-            st.image("image/apple.png", use_container_width=True)
-            if st.button("Select Apple", key="select_apple"):
-                st.session_state["body_shape"] = "Apple"
-        with cols[1]:
-            st.image("image/pear.png", use_container_width=True)
-            if st.button("Select Pear", key="select_pear"):
-                st.session_state["body_shape"] = "Pear"
-        with cols[2]:
-            st.image("image/hourglass.png", use_container_width=True)
-            if st.button("Select Hourglass", key="select_hourglass"):
-                st.session_state["body_shape"] = "Hourglass"
-        with cols[3]:
-            st.image("image/rectangle.png", use_container_width=True)
-            if st.button("Select Rectangle", key="select_rectangle"):
-                st.session_state["body_shape"] = "Rectangle"
-        with cols[4]:
-            st.image("image/inverted-triangle.png", use_container_width=True)
-            if st.button("Select Inverted Triangle", key="select_inverted"):
-                st.session_state["body_shape"] = "Inverted Triangle"
+        cols = st.columns(len(BODY_SHAPES))
+        images = body_shape_images()
+        for col, (shape, _, key) in zip(cols, BODY_SHAPES):
+            with col:
+                st.image(images[shape], use_container_width=True)
+                if st.button(f"Select {shape}", key=key):
+                    st.session_state["body_shape"] = shape
 
         st.header("User Profile")
         st.write("Fill out or edit your personal details below, then click 'Save Profile'.")
+        render_progress_key()
         with st.form("user_profile_form"):
             gender = st.selectbox("Gender", ["Male", "Female", "Other"], key="gender")
             height = st.number_input("Height (cm)", min_value=100, max_value=250, value=170, key="height")
@@ -268,47 +620,30 @@ def main():
             }
             st.session_state["user_profile"] = profile_data
             st.success("Profile saved successfully!")
-            if "profile_history" not in st.session_state:
-                st.session_state["profile_history"] = []
-            st.session_state["profile_history"].append(profile_data)
+            get_progress_store().add(current_user_id(), profile_data)
+            # A new profile gets a fresh attempt at plans that failed
+            st.session_state.pop("plan_errors", None)
+            # Start the initial plans now rather than when their tabs are first rendered
+            prefetch_plans(profile_data, st.session_state.get("workout_prefs"))
 
     # -------------------------
     # Tab 2: Meal Plan Chatbot
     # -------------------------
-    with tab_mealplan:
+    with tab_mealplan, section_timer("meal_plan"):
         st.header("Meal Plan Chatbot")
         if "user_profile" not in st.session_state:
             st.warning("Please fill in and save your profile first in the 'Profile' tab.")
-        else:
-            # Initialize conversation if not already done
-            if "meal_chat" not in st.session_state:
-                st.session_state["meal_chat"] = []
-                # Generate an initial response using the full meal plan prompt
-                initial_response = generate_weekly_meal_plan(st.session_state["user_profile"])
-                st.session_state["meal_chat"].append({"role": "assistant", "message": initial_response})
-            
-            st.markdown("### Conversation")
-            # Display conversation history
-            for msg in st.session_state["meal_chat"]:
-                if msg["role"] == "user":
-                    st.markdown(f"**You:** {msg['message']}")
-                else:
-                    st.markdown(f"**AI:** {msg['message']}")
-            
-            # User input for chat
-            user_input = st.text_input("Type your message here:", key="meal_input")
-            if st.button("Send", key="meal_send") and user_input:
-                # Append user message
-                st.session_state["meal_chat"].append({"role": "user", "message": user_input})
-                # Generate AI response
-                ai_response = chat_meal_plan(st.session_state["meal_chat"])
-                st.session_state["meal_chat"].append({"role": "assistant", "message": ai_response})
-                st.rerun()
+        elif collect_plan("meal", "meal_chat"):
+            chat_section("meal", chat_meal_plan)
+        elif not plan_failed("meal"):
+            # The initial plan is generated in the background; make sure it has been started
+            prefetch_plans(st.session_state["user_profile"], st.session_state.get("workout_prefs"))
+            plan_pending_notice("meal")
 
     # -------------------------
     # Tab 3: Workout Plan Chatbot
     # -------------------------
-    with tab_workout:
+    with tab_workout, section_timer("workout_plan"):
         st.header("Workout Plan Chatbot")
         # Step 1: Gather user workout prefs
         if "user_profile" not in st.session_state:
@@ -335,76 +670,73 @@ def main():
                         "session_duration": session_duration,
                         "other_workout_notes": other_workout_notes
                     }
+                    prefetch_plans(st.session_state["user_profile"], st.session_state["workout_prefs"])
                     st.success("Workout preferences saved successfully!")
                     st.rerun()
-            else:
-                # Step 2: Initialize workout chatbot if not already done
-                if "workout_chat" not in st.session_state:
-                    st.session_state["workout_chat"] = []
-                    # Generate an initial plan using the user profile + workout prefs
-                    initial_workout = generate_workout_plan(st.session_state["user_profile"], st.session_state["workout_prefs"])
-                    st.session_state["workout_chat"].append({"role": "assistant", "message": initial_workout})
-                
-                st.markdown("### Conversation")
-                # Display conversation history
-                for msg in st.session_state["workout_chat"]:
-                    if msg["role"] == "user":
-                        st.markdown(f"**You:** {msg['message']}")
-                    else:
-                        st.markdown(f"**AI:** {msg['message']}")
-
-                # Step 3: Chat interface
-                user_input = st.text_input("Type your message here:", key="workout_input")
-                if st.button("Send", key="workout_send") and user_input:
-                    # Append user message
-                    st.session_state["workout_chat"].append({"role": "user", "message": user_input})
-                    # Generate AI response
-                    ai_response = chat_workout_plan(st.session_state["workout_chat"])
-                    st.session_state["workout_chat"].append({"role": "assistant", "message": ai_response})
-                    st.rerun()
+            elif collect_plan("workout", "workout_chat"):
+                chat_section("workout", chat_workout_plan)
+            elif not plan_failed("workout"):
+                # Step 2: Wait for the initial plan generated from the user profile + workout prefs
+                prefetch_plans(st.session_state["user_profile"], st.session_state["workout_prefs"])
+                plan_pending_notice("workout")
 
     # -------------------------
     # Tab 4: Progress
     # -------------------------
-    with tab_progress:
+    with tab_progress, section_timer("progress"):
         st.header("Progress Tracker")
-        if "profile_history" not in st.session_state or len(st.session_state["profile_history"]) == 0:
+        store = get_progress_store()
+        user_id = current_user_id()
+        with st.expander("Import historical measurements"):
+            uploaded = st.file_uploader(
+                "CSV with columns: timestamp, height, current_weight, waist_circumference, hip_circumference",
+                type="csv",
+            )
+            if uploaded is not None and st.button("Import", key="import_history"):
+                with startup_timing.measure("import pandas"):
+                    import pandas as pd
+                try:
+                    imported = store.add_many(user_id, pd.read_csv(uploaded).fillna("").to_dict("records"))
+                    st.success(f"Imported {imported} measurements.")
+                except (ValueError, KeyError) as e:
+                    st.error(f"Could not import measurements: {e}")
+
+        summary = store.summary(user_id)
+        if summary is None:
             st.info("No profile history available. Please update your profile in the 'Profile' tab.")
         else:
             st.subheader("Profile History")
-            history_df = pd.DataFrame(st.session_state["profile_history"])
-            history_df['timestamp'] = pd.to_datetime(history_df['timestamp'])
-            history_df = history_df.sort_values(by='timestamp')
+            time_range = st.selectbox("Time range", list(PROGRESS_TIME_RANGES), index=2, key="progress_range")
+            window = PROGRESS_TIME_RANGES[time_range]
+            # Day granularity keeps the window start (and therefore the cache key) stable across reruns
+            start = datetime.now().date() - window if window else None
+            downsample = st.toggle("Downsample long histories", value=True, key="progress_downsample")
+            # Only the selected window is loaded from the store
+            history_df, progress_fig = load_progress_view(
+                user_id, summary["measurements"], start, PROGRESS_MAX_POINTS if downsample else None
+            )
             st.dataframe(history_df)
+            if history_df.empty:
+                st.info(f"No measurements in the selected range ({summary['measurements']} in total).")
 
-            history_df['BMI'] = history_df.apply(lambda row: row['current_weight'] / ((row['height']/100)**2), axis=1)
-            
             st.subheader("Interactive Progress Charts")
-            fig_weight = px.line(history_df, x="timestamp", y="current_weight", title="Weight Progress (kg)")
-            st.plotly_chart(fig_weight, use_container_width=True)
-
-            fig_waist = px.line(history_df, x="timestamp", y="waist_circumference", title="Waist Circumference Progress (cm)")
-            st.plotly_chart(fig_waist, use_container_width=True)
-
-            fig_hip = px.line(history_df, x="timestamp", y="hip_circumference", title="Hip Circumference Progress (cm)")
-            st.plotly_chart(fig_hip, use_container_width=True)
-
-            fig_bmi = px.line(history_df, x="timestamp", y="BMI", title="BMI Progress")
-            st.plotly_chart(fig_bmi, use_container_width=True)
+            st.plotly_chart(progress_fig, use_container_width=True)
 
             st.subheader("Summary Metrics")
-            initial = history_df.iloc[0]
-            latest = history_df.iloc[-1]
-            weight_change = latest['current_weight'] - initial['current_weight']
-            waist_change = latest['waist_circumference'] - initial['waist_circumference']
-            hip_change = latest['hip_circumference'] - initial['hip_circumference']
-            initial_bmi = initial['current_weight'] / ((initial['height']/100)**2)
-            latest_bmi = latest['BMI']
+            # Maintained incrementally by the store, so this does not depend on the selected window
+            latest, delta = summary["latest"], summary["delta"]
             col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Current Weight (kg)", f"{latest['current_weight']} kg", delta=f"{weight_change:+.1f} kg", delta_color="inverse")
-            col2.metric("Waist (cm)", f"{latest['waist_circumference']} cm", delta=f"{waist_change:+.1f} cm", delta_color="inverse")
-            col3.metric("Hip (cm)", f"{latest['hip_circumference']} cm", delta=f"{hip_change:+.1f} cm", delta_color="inverse")
-            col4.metric("BMI", f"{latest_bmi:.1f}", delta=f"{(latest_bmi - initial_bmi):+.1f}", delta_color="inverse")
+            col1.metric("Current Weight (kg)", f"{latest['current_weight']:g} kg", delta=f"{delta['current_weight']:+.1f} kg", delta_color="inverse")
+            col2.metric("Waist (cm)", f"{latest['waist_circumference']:g} cm", delta=f"{delta['waist_circumference']:+.1f} cm", delta_color="inverse")
+            col3.metric("Hip (cm)", f"{latest['hip_circumference']:g} cm", delta=f"{delta['hip_circumference']:+.1f} cm", delta_color="inverse")
+            col4.metric("BMI", f"{latest['BMI']:.1f}", delta=f"{delta['BMI']:+.1f}", delta_color="inverse")
 
 if __name__ == "__main__":
-    main()
+    try:
+        with session_profiler(), get_metrics().time("app_script_run_seconds", "Wall time of one full script run"):
+            main()
+    finally:
+        # Also reached when the run ends early with st.rerun() or st.stop()
+        export_metrics()
+    startup_timing.mark("first paint")
+    startup_timing.report()
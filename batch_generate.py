@@ -0,0 +1,229 @@
+"""
+Headless batch generation of initial meal and workout plans.
+
+Reads profiles (and optional workout preferences) from a CSV or JSONL file, generates the plans
+through a bounded thread pool and appends one JSON line per profile to the output file as soon
+as it completes. The output file doubles as the checkpoint: rerunning the same command skips
+profiles that already succeeded, so a crashed run resumes where it stopped.
+
+    python batch_generate.py profiles.csv plans.jsonl --workers 8
+    LLM_BACKEND=mock python batch_generate.py profiles.jsonl plans.jsonl
+    python batch_generate.py profiles.csv plans.jsonl --recordings responses.jsonl    # record Cohere responses
+    python batch_generate.py profiles.csv replayed.jsonl --backend mock --recordings responses.jsonl
+
+CSV files use the profile field names as columns (gender, height, current_weight, ...) plus an
+optional `id` column; a row also gets a workout plan when its `days_per_week` column is set.
+JSONL rows may instead carry a nested "workout_prefs" object.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import planner
+from llm_backends import create_backend
+from llm_gateway import LLMGateway
+from metrics import MetricsRegistry
+from plan_cache import PlanCache
+from plan_index import PlanIndex
+
+PROFILE_FIELDS = [
+    "gender", "body_shape", "height", "current_weight", "goal_weight", "waist_circumference",
+    "hip_circumference", "dietary_restrictions", "nutritional_goal", "ingredient_preferences", "allergies",
+]
+WORKOUT_FIELDS = ["days_per_week", "workout_style", "equipment", "location", "session_duration", "other_workout_notes"]
+NUMERIC_FIELDS = {"height", "current_weight", "goal_weight", "waist_circumference", "hip_circumference",
+                  "days_per_week", "session_duration"}
+
+
+def _coerce(field, value):
+    if field in NUMERIC_FIELDS and isinstance(value, str) and value.strip():
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    return value
+
+
+def read_rows(path):
+    """
+    Yields raw row dicts from a CSV or JSONL file, chosen by extension.
+    A JSONL line that cannot be decoded is yielded as its JSONDecodeError, so one bad line
+    does not end the run.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield e
+
+
+def parse_row(index, row):
+    """
+    Splits a raw row into (row id, user profile, workout prefs or None).
+    Raises ValueError for a malformed row, e.g. a non-numeric height.
+    """
+    if not isinstance(row, dict):
+        raise ValueError(f"expected a JSON object, got {type(row).__name__}")
+    row_id = _row_id(index, row)
+    profile = {field: _coerce(field, row.get(field, "")) for field in PROFILE_FIELDS}
+    prefs = row.get("workout_prefs")
+    if prefs is None and row.get("days_per_week") not in (None, ""):
+        prefs = {field: row.get(field, "") for field in WORKOUT_FIELDS}
+    if prefs and not isinstance(prefs, dict):
+        raise ValueError(f"workout_prefs must be an object, got {type(prefs).__name__}")
+    if prefs:
+        prefs = {field: _coerce(field, prefs.get(field, "")) for field in WORKOUT_FIELDS}
+    return row_id, profile, prefs or None
+
+
+def _row_id(index, row):
+    return str(row.get("id") or row.get("user_id") or index)
+
+
+def load_completed(path):
+    """
+    Returns the ids of rows that already succeeded in a previous run of the same output file.
+    A truncated last line from a crash is ignored.
+    """
+    completed = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("status") == "ok":
+                    completed.add(record["id"])
+    return completed
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def generate_row(row_id, profile, prefs, gateway, plan_cache, plan_index=None):
+    start = time.perf_counter()
+    record = {"id": row_id}
+    try:
+        record["meal_plan"] = planner.generate_weekly_meal_plan(profile, gateway, plan_cache, plan_index)
+        if prefs:
+            record["workout_plan"] = planner.generate_workout_plan(profile, prefs, gateway, plan_cache)
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_batch(input_path, output_path, gateway, plan_cache=None, workers=8, progress_every=100, plan_index=None):
+    """
+    Generates plans for every profile in `input_path` that is not yet in `output_path`.
+    At most `2 * workers` rows are in flight, so memory stays flat for arbitrarily large inputs.
+    Returns a summary dict with counts and rows/sec.
+    """
+    completed = load_completed(output_path)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        if out.tell() and not _ends_with_newline(output_path):
+            # Terminate a line truncated by a crash so the next record starts on its own line
+            out.write("\n")
+        pending = set()
+
+        def write(record):
+            # Results are only written from this thread, one complete line at a time
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            processed = counts["ok"] + counts["error"]
+            if progress_every and processed % progress_every == 0:
+                rate = processed / (time.perf_counter() - start)
+                print(f"{processed} rows ({counts['error']} failed), {rate:.1f} rows/s", file=sys.stderr)
+
+        def drain(return_when):
+            nonlocal pending
+            done, pending = wait(pending, return_when=return_when)
+            for future in done:
+                write(future.result())
+
+        try:
+            for index, row in enumerate(read_rows(input_path)):
+                try:
+                    if isinstance(row, Exception):
+                        raise row
+                    row_id, profile, prefs = parse_row(index, row)
+                except ValueError as e:
+                    # Recorded like a failed generation, so the row is retried on the next run
+                    row_id = _row_id(index, row) if isinstance(row, dict) else str(index)
+                    write({"id": row_id, "status": "error", "error": f"{type(e).__name__}: {e}"})
+                    continue
+                if row_id in completed:
+                    counts["skipped"] += 1
+                    continue
+                pending.add(executor.submit(generate_row, row_id, profile, prefs, gateway, plan_cache, plan_index))
+                if len(pending) >= 2 * workers:
+                    drain(FIRST_COMPLETED)
+        finally:
+            # Rows already in flight are written even if reading the input fails
+            if pending:
+                drain(ALL_COMPLETED)
+
+    elapsed = time.perf_counter() - start
+    processed = counts["ok"] + counts["error"]
+    return dict(counts, seconds=elapsed, rows_per_s=processed / elapsed if elapsed else 0.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="profiles as .csv or .jsonl")
+    parser.add_argument("output", help="JSONL file results are appended to (also the resume checkpoint)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent generations")
+    parser.add_argument("--backend", help='"cohere" or "mock" (default: $LLM_BACKEND or cohere)')
+    parser.add_argument("--key-path", default="cohere.key", help="Cohere API key file")
+    parser.add_argument("--recordings", help="JSONL file Cohere responses are recorded to and the mock backend "
+                                             "replays from (default: $LLM_RECORDING_PATH)")
+    parser.add_argument("--requests-per-second", type=float, default=2.0, help="LLM rate limit")
+    parser.add_argument("--cache", help="plan cache SQLite file to reuse across runs (e.g. plan_cache.sqlite3)")
+    parser.add_argument("--reuse-index", help="plan index SQLite file; serves similar profiles from earlier plans")
+    parser.add_argument("--reuse-threshold", type=float, default=0.85, help="similarity (0-1) needed for reuse")
+    parser.add_argument("--metrics", help="write LLM call metrics in Prometheus text format to this file at the end")
+    args = parser.parse_args(argv)
+
+    metrics = MetricsRegistry() if args.metrics else None
+    gateway = LLMGateway(
+        create_backend(args.backend, key_path=args.key_path, recording_path=args.recordings),
+        requests_per_second=args.requests_per_second,
+        max_queued=args.workers * 2,
+        queue_timeout=600,
+        metrics=metrics,
+    )
+    plan_cache = PlanCache(args.cache) if args.cache else None
+    plan_index = PlanIndex(args.reuse_index, threshold=args.reuse_threshold) if args.reuse_index else None
+    summary = run_batch(args.input, args.output, gateway, plan_cache, workers=args.workers, plan_index=plan_index)
+    print(
+        f"Done: {summary['ok']} succeeded, {summary['error']} failed, {summary['skipped']} skipped (already done) "
+        f"in {summary['seconds']:.1f}s, {summary['rows_per_s']:.2f} rows/s"
+    )
+    if plan_index is not None:
+        reuse = plan_index.stats()
+        print(f"Reused {reuse['reused'] + reuse['adapted']} of {reuse['lookups']} meal plans "
+              f"({reuse['reuse_rate']:.0%}, {reuse['adapted']} adapted)")
+    if metrics is not None:
+        metrics.write(args.metrics)
+    return 1 if summary["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
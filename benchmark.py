@@ -0,0 +1,214 @@
+"""
+Network-free latency and throughput benchmark for the planner functions.
+
+Drives generate_weekly_meal_plan, generate_workout_plan, chat_meal_plan, chat_workout_plan and
+refine_meal_plan through the LLM gateway against the local MockBackend, with N concurrent simulated sessions.
+
+    python benchmark.py --sessions 8 --turns 3 --latency 0.2 --tokens-per-second 200
+    python benchmark.py --max-p95 1.5 --json bench.json   # exits with status 1 on regression
+
+Sessions use fixed profiles and requests, so real responses can be recorded once with Cohere and
+replayed by the mock on later runs with the same --sessions and --turns:
+
+    python benchmark.py --record bench_responses.jsonl --sessions 4 --turns 2
+    python benchmark.py --recordings bench_responses.jsonl --sessions 4 --turns 2
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import planner
+from chat_context import ChatContext
+from llm_backends import MockBackend, create_backend
+from llm_gateway import LLMGateway
+from meal_plan import parse_meal_plan
+
+SAMPLE_PROFILE = {
+    "gender": "Female",
+    "body_shape": "Pear",
+    "height": 165,
+    "current_weight": 70,
+    "goal_weight": 62,
+    "waist_circumference": 78,
+    "hip_circumference": 102,
+    "dietary_restrictions": "vegetarian",
+    "nutritional_goal": "Weight Loss",
+    "ingredient_preferences": "likes lentils, dislikes mushrooms",
+    "allergies": "peanuts",
+}
+
+SAMPLE_WORKOUT_PREFS = {
+    "days_per_week": 4,
+    "workout_style": "Mixed",
+    "equipment": "dumbbells, resistance bands",
+    "location": "Home",
+    "session_duration": 45,
+    "other_workout_notes": "sensitive knees",
+}
+
+
+def sample_profile(session_id):
+    """
+    Returns the profile of simulated session `session_id`. Profiles differ per session, so that
+    identical prompts are not coalesced by the gateway, but are the same on every run, so that
+    recorded responses match.
+    """
+    return dict(SAMPLE_PROFILE, current_weight=SAMPLE_PROFILE["current_weight"] + session_id)
+
+
+def percentile(values, pct):
+    """
+    Returns the nearest-rank percentile of `values`.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def timed(records, name, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    records.append((name, time.perf_counter() - start))
+    return result
+
+
+def timed_stream(records, name, chunks):
+    """
+    Drains a streamed reply, recording time to first chunk and total time.
+    """
+    start = time.perf_counter()
+    parts = []
+    for chunk in chunks:
+        if not parts:
+            records.append((name + " (first token)", time.perf_counter() - start))
+        parts.append(chunk)
+    records.append((name, time.perf_counter() - start))
+    return "".join(parts).strip()
+
+
+def run_session(session_id, gateway, turns, stream):
+    """
+    Simulates one user: both initial plans, `turns` chat turns with each chatbot and `turns` targeted meal edits.
+    """
+    records = []
+    profile = sample_profile(session_id)
+
+    for name, generate, chat, args in (
+        ("meal", planner.generate_weekly_meal_plan, planner.chat_meal_plan, (profile,)),
+        ("workout", planner.generate_workout_plan, planner.chat_workout_plan, (profile, SAMPLE_WORKOUT_PREFS)),
+    ):
+        plan = timed(records, generate.__name__, generate, *args, gateway)
+        conversation = [{"role": "assistant", "message": plan}]
+        context = ChatContext()
+        for turn in range(turns):
+            conversation = conversation + [{"role": "user", "message": f"Can you change day {turn + 1} of the {name} plan?"}]
+            if stream:
+                reply = timed_stream(records, chat.__name__, chat(conversation, *args, context, gateway, stream=True))
+            else:
+                reply = timed(records, chat.__name__, chat, conversation, *args, context, gateway)
+            conversation = conversation + [{"role": "assistant", "message": reply}]
+
+    # Targeted edits regenerate a single meal instead of re-emitting the whole plan
+    meal_plan = parse_meal_plan(planner.generate_weekly_meal_plan(profile, gateway))
+    for turn in range(turns if meal_plan else 0):
+        request = f"Swap the lunch on day {turn % len(meal_plan.days) + 1}"
+        refined = timed(records, "refine_meal_plan", planner.refine_meal_plan, meal_plan, request, profile, gateway)
+        if refined is not None:
+            meal_plan = refined[0]
+    return records
+
+
+def run_benchmark(sessions=8, turns=3, latency=0.2, tokens_per_second=200.0, stream=False, recording_path=None,
+                  record_path=None):
+    """
+    Runs `sessions` simulated sessions concurrently and returns latency, throughput and prompt-size results.
+    With `record_path`, the sessions run against Cohere and every response is recorded there instead.
+    """
+    if record_path:
+        backend = create_backend("cohere", recording_path=record_path)
+        gateway = LLMGateway(backend, max_queued=sessions * 4)
+    else:
+        backend = MockBackend(recording_path=recording_path, latency=latency, tokens_per_second=tokens_per_second)
+        # Rate limiting would measure the limiter rather than the app, so it is effectively disabled
+        gateway = LLMGateway(backend, requests_per_second=1e6, burst=1e6, max_queued=sessions * 4)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        session_records = list(executor.map(lambda i: run_session(i, gateway, turns, stream), range(sessions)))
+    wall_time = time.perf_counter() - start
+
+    latencies = {}
+    for records in session_records:
+        for name, seconds in records:
+            latencies.setdefault(name, []).append(seconds)
+    prompt_tokens = {}
+    # Only the mock logs prompts; a recording run reports the gateway's call count instead
+    prompt_log = getattr(backend, "prompt_log", [])
+    for kind, tokens in prompt_log:
+        prompt_tokens.setdefault(kind, []).append(tokens)
+
+    calls = len(prompt_log) if prompt_log else gateway.stats()["requests"]
+    return {
+        "sessions": sessions,
+        "turns": turns,
+        "stream": stream,
+        "wall_time_s": wall_time,
+        "calls": calls,
+        "calls_per_s": calls / wall_time,
+        "sessions_per_s": sessions / wall_time,
+        "latency_s": {
+            name: {"p50": percentile(values, 50), "p95": percentile(values, 95), "n": len(values)}
+            for name, values in sorted(latencies.items())
+        },
+        "prompt_tokens": {
+            kind: {"mean": sum(values) / len(values), "max": max(values), "n": len(values)}
+            for kind, values in sorted(prompt_tokens.items())
+        },
+        "gateway": gateway.stats(),
+    }
+
+
+def print_report(results):
+    print(f"{results['sessions']} sessions x {results['turns']} turns"
+          f"{' (streaming)' if results['stream'] else ''}: {results['calls']} LLM calls in {results['wall_time_s']:.2f}s")
+    print(f"Throughput: {results['calls_per_s']:.1f} calls/s, {results['sessions_per_s']:.2f} sessions/s\n")
+    print(f"{'function':<40}{'p50 (s)':>10}{'p95 (s)':>10}{'n':>6}")
+    for name, stats in results["latency_s"].items():
+        print(f"{name:<40}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['n']:>6}")
+    print(f"\n{'prompt kind':<40}{'mean tok':>10}{'max tok':>10}{'n':>6}")
+    for kind, stats in results["prompt_tokens"].items():
+        print(f"{kind:<40}{stats['mean']:>10.0f}{stats['max']:>10}{stats['n']:>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8, help="number of concurrent simulated sessions")
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per chatbot per session")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="mock generation rate")
+    parser.add_argument("--stream", action="store_true", help="use streaming for chat turns")
+    parser.add_argument("--recordings", help="JSONL recording to replay (see RecordingBackend)")
+    parser.add_argument("--record", help="run against Cohere and record the responses to this JSONL file")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--max-p95", type=float, help="fail if any function's p95 latency exceeds this (s)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.sessions, args.turns, args.latency, args.tokens_per_second,
+                            args.stream, args.recordings, args.record)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.max_p95 is not None:
+        slow = [name for name, stats in results["latency_s"].items() if stats["p95"] > args.max_p95]
+        if slow:
+            print(f"\np95 latency above {args.max_p95}s: {', '.join(slow)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+from collections import deque
+
+# ----------------------------------------------------------------
+# Token-budgeted conversation context for the chatbots
+# ----------------------------------------------------------------
+
+# Rough average for English text; good enough for budgeting without a network round-trip.
+CHARS_PER_TOKEN = 4
+# Per-call prompt sizes kept for inspection; totals cover every call
+PROMPT_LOG_SIZE = 50
+
+
+def estimate_tokens(text):
+    """
+    Approximates the number of model tokens in `text`.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _render(msg):
+    prefix = "User: " if msg["role"] == "user" else "AI: "
+    return prefix + msg["message"] + "\n"
+
+
+def summarize_turns(summary, messages, max_chars_per_message=200):
+    """
+    Extends an existing summary with one short line per folded message.
+    Only the first sentence of each message is kept.
+    """
+    lines = [summary] if summary else []
+    for msg in messages:
+        text = " ".join(msg["message"].split())
+        first_sentence = text.split(". ")[0][:max_chars_per_message]
+        who = "User asked" if msg["role"] == "user" else "AI replied"
+        lines.append(f"- {who}: {first_sentence}")
+    return "\n".join(lines)
+
+
+class ChatContext:
+    """
+    Maintains the prompt context for one chatbot conversation within a token budget.
+
+    The latest plan and the last `recent_turns` user/AI turns are kept verbatim. Older
+    messages are folded into a summary that is extended incrementally, so each prompt is
+    assembled from a handful of pre-rendered parts rather than the whole history.
+    """
+
+    def __init__(self, token_budget=3000, recent_turns=4, summary_budget=400,
+                 plan_min_tokens=300, summarizer=summarize_turns):
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summary_budget = summary_budget
+        self.plan_min_tokens = plan_min_tokens
+        self.summarizer = summarizer
+        self.reset()
+
+    def reset(self):
+        self.plan = ""
+        self.plan_index = None
+        self.summary = ""
+        self.summary_tokens = 0
+        # (message index, message, rendered line, token count) for the verbatim window
+        self.recent = deque()
+        self.recent_tokens = 0
+        self.synced_count = 0
+        self.synced_last = None
+        self.history_tokens = 0
+        self.last_prompt_tokens = 0
+        self.prompt_log = deque(maxlen=PROMPT_LOG_SIZE)
+        self.prompt_calls = 0
+        self.total_prompt_tokens = 0
+        self.total_full_history_tokens = 0
+
+    def _is_plan(self, index, msg):
+        if msg["role"] != "assistant":
+            return False
+        return index == 0 or estimate_tokens(msg["message"]) >= self.plan_min_tokens
+
+    def _fold(self, count):
+        folded = [self.recent.popleft() for _ in range(count)]
+        self.recent_tokens -= sum(tokens for _, _, _, tokens in folded)
+        self.summary = self.summarizer(self.summary, [msg for _, msg, _, _ in folded])
+        # Keep the summary itself within budget by dropping its oldest lines
+        lines = self.summary.split("\n")
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_budget:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+        self.summary_tokens = estimate_tokens(self.summary)
+
+    def add_message(self, msg):
+        """
+        Appends one committed message to the context.
+        """
+        index = self.synced_count
+        line = _render(msg)
+        tokens = estimate_tokens(line)
+        self.history_tokens += tokens
+        if self._is_plan(index, msg):
+            self.plan = msg["message"]
+            self.plan_index = index
+        self.recent.append((index, msg, line, tokens))
+        self.recent_tokens += tokens
+        overflow = len(self.recent) - 2 * self.recent_turns
+        if overflow > 0:
+            self._fold(overflow)
+        self.synced_count += 1
+        self.synced_last = msg
+
+    def pin_plan(self, plan_text):
+        """
+        Replaces the plan sent with every prompt, e.g. after part of it was edited outside the chat.
+        The message the plan came from stays out of the verbatim window.
+        """
+        self.plan = plan_text
+
+    def sync(self, conversation, end=None):
+        """
+        Brings the context up to date with `conversation[:end]`, adding only unseen messages.
+        Only the unseen tail and the last seen message are read, so a transcript whose older
+        messages live on disk is not loaded. The context is rebuilt if the conversation was
+        reset or rewritten.
+        """
+        end = len(conversation) if end is None else end
+        if end < self.synced_count or (
+            self.synced_count and conversation[self.synced_count - 1] != self.synced_last
+        ):
+            self.reset()
+        for msg in conversation[self.synced_count:end]:
+            self.add_message(msg)
+
+    def build_prompt(self, header, pending_message=None):
+        """
+        Assembles the prompt from `header`, the latest plan, the summary and the recent turns.
+        Recent turns are folded into the summary while the prompt exceeds the token budget.
+        """
+        pending_line = _render(pending_message) if pending_message else ""
+        fixed_tokens = estimate_tokens(header) + estimate_tokens(pending_line) + 1
+        plan_tokens = estimate_tokens(self.plan) if self.plan else 0
+
+        def window_tokens():
+            plan_in_window = any(index == self.plan_index for index, _, _, _ in self.recent)
+            return self.recent_tokens - (plan_tokens if plan_in_window else 0)
+
+        while self.recent and fixed_tokens + plan_tokens + self.summary_tokens + window_tokens() > self.token_budget:
+            self._fold(1)
+
+        parts = [header]
+        if self.plan:
+            parts.append("Current plan:\n" + self.plan + "\n\n")
+        if self.summary:
+            parts.append("Summary of the earlier conversation:\n" + self.summary + "\n\n")
+        parts.extend(line for index, _, line, _ in self.recent if index != self.plan_index)
+        parts.append(pending_line)
+        parts.append("AI:")
+        prompt = "".join(parts)
+
+        self.last_prompt_tokens = estimate_tokens(prompt)
+        full_history_tokens = estimate_tokens(header) + self.history_tokens + estimate_tokens(pending_line) + 1
+        self.prompt_log.append({"prompt_tokens": self.last_prompt_tokens, "full_history_tokens": full_history_tokens})
+        self.prompt_calls += 1
+        self.total_prompt_tokens += self.last_prompt_tokens
+        self.total_full_history_tokens += full_history_tokens
+        return prompt
+
+    def stats(self):
+        """
+        Returns per-call prompt token counts and the cumulative saving versus sending the full history.
+        """
+        return {
+            "calls": self.prompt_calls,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "total_prompt_tokens": self.total_prompt_tokens,
+            "total_full_history_tokens": self.total_full_history_tokens,
+            "tokens_saved": self.total_full_history_tokens - self.total_prompt_tokens,
+        }
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from chat_context import estimate_tokens
+
+# ----------------------------------------------------------------
+# LLM backends: Cohere, a local mock for benchmarks, and a recorder
+# ----------------------------------------------------------------
+
+
+class LLMBackend:
+    """
+    The interface the gateway uses to talk to a model provider.
+
+    `generate` returns the full completion text; `stream` yields text chunks as they are produced.
+    Implementations raise exceptions carrying a `status_code` for HTTP errors so the gateway
+    can decide whether to retry.
+    """
+
+    name = "base"
+
+    def generate(self, prompt, model, max_tokens, temperature):
+        raise NotImplementedError
+
+    def stream(self, prompt, model, max_tokens, temperature):
+        raise NotImplementedError
+
+
+class CohereBackend(LLMBackend):
+    """
+    Calls Cohere's generate endpoint through a (pooled) `cohere.Client`.
+    """
+
+    name = "cohere"
+
+    def __init__(self, client):
+        self.client = client
+
+    def generate(self, prompt, model, max_tokens, temperature):
+        response = self.client.generate(model=model, prompt=prompt, max_tokens=max_tokens, temperature=temperature)
+        return response.generations[0].text.strip()
+
+    def stream(self, prompt, model, max_tokens, temperature):
+        params = {"model": model, "prompt": prompt, "max_tokens": max_tokens, "temperature": temperature}
+        if hasattr(self.client, "generate_stream"):
+            stream = self.client.generate_stream(**params)
+        else:
+            stream = self.client.generate(stream=True, **params)
+        try:
+            for event in stream:
+                event_type = getattr(event, "event_type", "text-generation")
+                if event_type == "stream-error":
+                    raise RuntimeError(f"Generation stream failed: {event.err}")
+                if event_type == "text-generation" and event.text:
+                    yield event.text
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+
+def create_cohere_client(api_key, max_connections=20, timeout=120):
+    """
+    Creates a Cohere client backed by a pooled HTTP connection (cohere>=5).
+    Retries are left to the gateway so that they are not applied twice.
+    """
+    import cohere
+
+    try:
+        import httpx
+    except ImportError:  # cohere<5 does not depend on httpx
+        return cohere.Client(api_key)
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=timeout,
+    )
+    try:
+        return cohere.Client(api_key, httpx_client=http_client, max_retries=0)
+    except TypeError:
+        http_client.close()
+        return cohere.Client(api_key)
+
+
+def prompt_fingerprint(prompt, model):
+    """
+    Returns the key under which a prompt's response is recorded.
+    """
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def load_recordings(path):
+    """
+    Loads a JSONL file of {"fingerprint", "prompt", "response"} records into a dict keyed by fingerprint.
+    """
+    recordings = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    recordings[record["fingerprint"]] = record["response"]
+    return recordings
+
+
+# Used by MockBackend when a prompt has no recording.
+CANNED_RESPONSES = {
+    "meal": (
+        '{"Day 1": {"Breakfast": "Oatmeal with berries and almonds", "Snack": "Greek yogurt", '
+        '"Lunch": "Grilled chicken salad with quinoa", "Snack": "Apple with peanut butter", '
+        '"Dinner": "Baked salmon with roasted vegetables", "Total Daily Calories": 1850}}'
+    ),
+    "workout": (
+        "Day 1:\n  - Warm-up: 5 min brisk walk\n  - Main Workout: 3x12 squats, push-ups, rows\n"
+        "  - Cool-down: 5 min stretching\nDay 2: Rest Day"
+    ),
+    "chat": "Sure, here is an updated suggestion based on your request.",
+    "meal_slot": '{"items": ["Lentil soup", "Wholegrain roll"], "calories": 450}',
+    "meal_day": (
+        '{"Breakfast": {"items": ["Oatmeal", "Berries"], "calories": 350}, "Morning Snack": {"items": ["Yogurt"], "calories": 150}, '
+        '"Lunch": {"items": ["Lentil soup"], "calories": 450}, "Afternoon Snack": {"items": ["Apple"], "calories": 100}, '
+        '"Dinner": {"items": ["Tofu stir-fry", "Rice"], "calories": 650}, "total_calories": 1700}'
+    ),
+}
+
+
+def canned_kind(prompt):
+    if "editing one meal" in prompt:
+        return "meal_slot"
+    if "editing one day" in prompt:
+        return "meal_day"
+    if "conversational AI" in prompt:
+        return "chat"
+    if "fitness coach" in prompt:
+        return "workout"
+    return "meal"
+
+
+class MockBackend(LLMBackend):
+    """
+    A local, network-free stand-in for a real provider.
+
+    Responses are replayed from a JSONL recording (see RecordingBackend) when the prompt was
+    recorded, otherwise a canned response for the prompt kind is used. Each call waits
+    `latency` seconds before the first token and then emits `tokens_per_second` tokens.
+    """
+
+    name = "mock"
+
+    def __init__(self, recording_path=None, latency=0.5, tokens_per_second=50.0, responses=None):
+        self.recordings = load_recordings(recording_path)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.responses = dict(CANNED_RESPONSES, **(responses or {}))
+        # (prompt kind, estimated prompt tokens) for every call, for benchmarks
+        self.prompt_log = []
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt, model):
+        with self._lock:
+            self.prompt_log.append((canned_kind(prompt), estimate_tokens(prompt)))
+        recorded = self.recordings.get(prompt_fingerprint(prompt, model))
+        return recorded if recorded is not None else self.responses[canned_kind(prompt)]
+
+    def _chunks(self, text):
+        # Whitespace-delimited words stand in for tokens
+        words = text.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def generate(self, prompt, model, max_tokens, temperature):
+        text = self._respond(prompt, model)
+        chunks = self._chunks(text)[:max_tokens]
+        time.sleep(self.latency + len(chunks) / self.tokens_per_second)
+        return "".join(chunks).strip()
+
+    def stream(self, prompt, model, max_tokens, temperature):
+        text = self._respond(prompt, model)
+        time.sleep(self.latency)
+        for chunk in self._chunks(text)[:max_tokens]:
+            time.sleep(1 / self.tokens_per_second)
+            yield chunk
+
+
+class RecordingBackend(LLMBackend):
+    """
+    Wraps another backend and appends every prompt/response pair to a JSONL file for MockBackend to replay.
+    Streamed responses are recorded once the stream completes.
+    """
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.name = f"recording:{backend.name}"
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _record(self, prompt, model, response):
+        record = {"fingerprint": prompt_fingerprint(prompt, model), "prompt": prompt, "response": response}
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def generate(self, prompt, model, max_tokens, temperature):
+        text = self.backend.generate(prompt, model, max_tokens, temperature)
+        self._record(prompt, model, text)
+        return text
+
+    def stream(self, prompt, model, max_tokens, temperature):
+        parts = []
+        for chunk in self.backend.stream(prompt, model, max_tokens, temperature):
+            parts.append(chunk)
+            yield chunk
+        self._record(prompt, model, "".join(parts).strip())
+
+
+def create_backend(name=None, key_path="cohere.key", recording_path=None):
+    """
+    Builds a backend by name ("cohere" or "mock"), defaulting to the LLM_BACKEND environment variable.
+
+    The mock backend reads MOCK_LLM_LATENCY and MOCK_LLM_TOKENS_PER_SECOND. If `recording_path`
+    (default: the LLM_RECORDING_PATH environment variable) is set, the Cohere backend records every
+    response to it and the mock backend replays from it.
+    """
+    name = name or os.environ.get("LLM_BACKEND", "cohere")
+    recording_path = recording_path or os.environ.get("LLM_RECORDING_PATH")
+    if name == "mock":
+        return MockBackend(
+            recording_path=recording_path,
+            latency=float(os.environ.get("MOCK_LLM_LATENCY", "0.5")),
+            tokens_per_second=float(os.environ.get("MOCK_LLM_TOKENS_PER_SECOND", "50")),
+        )
+    if name == "cohere":
+        with open(key_path) as f:
+            backend = CohereBackend(create_cohere_client(f.read().strip()))
+        return RecordingBackend(backend, recording_path) if recording_path else backend
+    raise ValueError(f"Unknown LLM backend: {name!r}")
@@ -0,0 +1,227 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from chat_context import estimate_tokens
+from metrics import TOKEN_BUCKETS
+
+try:
+    import httpx
+except ImportError:  # cohere<5 does not depend on httpx
+    httpx = None
+
+# ----------------------------------------------------------------
+# Shared LLM gateway: pooling, coalescing, rate limiting and retries
+# ----------------------------------------------------------------
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimitExceeded(RuntimeError):
+    """
+    Raised when a request cannot get a rate-limit token because the queue is full or the wait timed out.
+    """
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket allowing `rate` requests per second with bursts of up to `capacity`.
+    At most `max_waiters` callers may queue for a token; further callers fail immediately.
+    """
+
+    def __init__(self, rate, capacity, max_waiters=32, timeout=60):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._waiters = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        with self._cond:
+            if self._waiters >= self.max_waiters:
+                raise RateLimitExceeded(f"More than {self.max_waiters} LLM requests are already queued.")
+            self._waiters += 1
+            try:
+                deadline = time.monotonic() + self.timeout
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    if now >= deadline:
+                        raise RateLimitExceeded(f"Timed out after {self.timeout}s waiting for an LLM rate-limit slot.")
+                    self._cond.wait(min((1 - self._tokens) / self.rate, deadline - now))
+            finally:
+                self._waiters -= 1
+
+
+def is_retryable(error):
+    """
+    Returns True for rate-limit (429) and server (5xx) errors and for transport failures.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class LLMGateway:
+    """
+    The single entry point for LLM calls in the process, in front of a pluggable LLMBackend.
+
+    Identical in-flight `generate` requests are coalesced so that concurrent callers share one
+    result. Every outgoing request takes a token from a rate limiter, and 429/5xx failures are
+    retried with full-jitter exponential backoff. With a `metrics` registry, every backend call
+    records its latency, estimated prompt/completion tokens and outcome.
+    """
+
+    def __init__(self, backend, requests_per_second=2.0, burst=5, max_queued=32, queue_timeout=60,
+                 max_retries=4, base_delay=0.5, max_delay=8.0, metrics=None):
+        self.backend = backend
+        self.metrics = metrics
+        self.limiter = TokenBucket(requests_per_second, burst, max_waiters=max_queued, timeout=queue_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "coalesced": 0, "retries": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _acquire(self):
+        start = time.perf_counter()
+        self.limiter.acquire()
+        if self.metrics is not None:
+            self.metrics.histogram(
+                "llm_rate_limit_wait_seconds", "Time spent waiting for the LLM rate limiter"
+            ).observe(time.perf_counter() - start)
+
+    def _record(self, operation, params, start, outcome, completion_tokens=0, error=None):
+        """
+        Records one backend call: outcome is "ok", "error" or "cancelled" (stream closed early).
+        """
+        if self.metrics is None:
+            return
+        labels = {"operation": operation, "model": params["model"]}
+        self.metrics.histogram("llm_request_duration_seconds", "Wall time of one LLM backend call").observe(
+            time.perf_counter() - start, outcome=outcome, **labels
+        )
+        self.metrics.histogram("llm_prompt_tokens", "Estimated prompt tokens per LLM call", TOKEN_BUCKETS).observe(
+            estimate_tokens(params["prompt"]), **labels
+        )
+        if outcome != "error":
+            self.metrics.histogram(
+                "llm_completion_tokens", "Estimated completion tokens per LLM call", TOKEN_BUCKETS
+            ).observe(completion_tokens, **labels)
+        if error is not None:
+            self.metrics.counter("llm_errors_total", "Failed LLM backend calls, including retried ones").inc(
+                error=type(error).__name__, **labels
+            )
+
+    def _backoff(self, attempt):
+        self._count("retries")
+        time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def _call_with_retries(self, params):
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            self._count("requests")
+            start = time.perf_counter()
+            try:
+                text = self.backend.generate(**params)
+                self._record("generate", params, start, "ok", estimate_tokens(text))
+                return text
+            except Exception as e:
+                self._record("generate", params, start, "error", error=e)
+                if attempt == self.max_retries or not is_retryable(e):
+                    self._count("errors")
+                    raise
+            self._backoff(attempt)
+
+    def generate(self, prompt, model, max_tokens=2000, temperature=0.7):
+        """
+        Returns the generated text for `prompt`, sharing the result with identical in-flight requests.
+        """
+        params = {"model": model, "prompt": prompt, "max_tokens": max_tokens, "temperature": temperature}
+        key = json.dumps(params, sort_keys=True)
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self._stats["coalesced"] += 1
+        if not is_leader:
+            if self.metrics is not None:
+                self.metrics.counter("llm_coalesced_requests_total", "Requests served by an identical in-flight call").inc()
+            return future.result()
+
+        try:
+            text = self._call_with_retries(params)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(text)
+            return text
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stream(self, prompt, model, max_tokens=2000, temperature=0.7):
+        """
+        Yields text chunks as they are generated.
+        Failures are only retried before the first chunk, so callers never see duplicated text.
+        The underlying stream is closed if the consumer stops early.
+        """
+        params = {"model": model, "prompt": prompt, "max_tokens": max_tokens, "temperature": temperature}
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            self._count("requests")
+            started = False
+            start = time.perf_counter()
+            chunks, outcome, error = [], "cancelled", None
+            stream = None
+            try:
+                stream = self.backend.stream(**params)
+                for chunk in stream:
+                    if not started and self.metrics is not None:
+                        self.metrics.histogram(
+                            "llm_stream_first_token_seconds", "Time to the first streamed chunk"
+                        ).observe(time.perf_counter() - start, model=params["model"])
+                    started = True
+                    chunks.append(chunk)
+                    yield chunk
+                outcome = "ok"
+                return
+            except Exception as e:
+                outcome, error = "error", e
+                if started or attempt == self.max_retries or not is_retryable(e):
+                    self._count("errors")
+                    raise
+            finally:
+                if stream is not None:
+                    stream.close()
+                self._record("stream", params, start, outcome, estimate_tokens("".join(chunks)), error)
+            self._backoff(attempt)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._in_flight)
+        return stats
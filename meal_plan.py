@@ -0,0 +1,351 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+# ----------------------------------------------------------------
+# Structured meal plan model and a tolerant parser for LLM output
+# ----------------------------------------------------------------
+
+MEAL_SLOTS = ["Breakfast", "Morning Snack", "Lunch", "Afternoon Snack", "Dinner"]
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+@dataclass
+class Meal:
+    items: list = field(default_factory=list)
+    calories: int = None
+
+
+@dataclass
+class DayPlan:
+    label: str
+    meals: dict = field(default_factory=dict)  # slot name -> Meal, in MEAL_SLOTS order
+    total_calories: int = None
+
+    def recompute_total(self):
+        """
+        Sets the day total from the meal calories when every meal has a calorie figure.
+        """
+        calories = [meal.calories for meal in self.meals.values()]
+        if calories and all(c is not None for c in calories):
+            self.total_calories = sum(calories)
+
+
+@dataclass
+class MealPlan:
+    days: list = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            "days": [
+                {
+                    "day": day.label,
+                    "meals": {slot: {"items": meal.items, "calories": meal.calories} for slot, meal in day.meals.items()},
+                    "total_calories": day.total_calories,
+                }
+                for day in self.days
+            ]
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+
+class _Pairs(list):
+    """
+    A JSON object as an ordered list of (key, value) pairs, so duplicate keys such as two "Snack" entries survive.
+    """
+
+
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _normalize_quotes(text):
+    """
+    Rewrites Python-style single-quoted strings and True/False/None as JSON. Double-quoted strings
+    (which may contain apostrophes) are kept as they are.
+    """
+    parts = []
+    i = 0
+    while i < len(text):
+        quote = text[i]
+        if quote not in "'\"":
+            end = min((j for j in (text.find("'", i), text.find('"', i)) if j != -1), default=len(text))
+            parts.append(re.sub(r"\b(True|False|None)\b", lambda m: PYTHON_LITERALS[m.group()], text[i:end]))
+            i = end
+            continue
+        chars = []
+        j = i + 1
+        while j < len(text) and text[j] != quote:
+            if text[j] == "\\" and j + 1 < len(text):
+                chars.append(text[j:j + 2])
+                j += 2
+            else:
+                chars.append(text[j])
+                j += 1
+        body = "".join(chars)
+        if quote == "'":
+            # Other escapes mean the same in both syntaxes; bare double quotes must be escaped in JSON
+            body = re.sub(r'(?<!\\)"', r'\\"', body.replace("\\'", "'"))
+        parts.append(f'"{body}"')
+        i = j + 1
+    return "".join(parts)
+
+
+def _loads(candidate):
+    try:
+        return json.loads(candidate, object_pairs_hook=_Pairs)
+    except json.JSONDecodeError:
+        pass
+    cleaned = re.sub(r"//[^\n]*", "", candidate)
+    cleaned = re.sub(r",\s*([}\]])", r"\1", cleaned)
+    # Single quotes are rewritten rather than parsed with ast.literal_eval, whose dicts would drop duplicate keys
+    for attempt in (cleaned, _normalize_quotes(cleaned)):
+        try:
+            return json.loads(attempt, object_pairs_hook=_Pairs)
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def _extract_structure(text):
+    """
+    Returns the largest JSON-like object or array embedded in `text`, or None.
+    """
+    text = re.sub(r"```(?:json)?", "", text)
+    for opener, closer in (("{", "}"), ("[", "]")):
+        start, end = text.find(opener), text.rfind(closer)
+        if start != -1 and end > start:
+            data = _loads(text[start:end + 1])
+            if data is not None:
+                return data
+    return None
+
+
+def _is_array(value):
+    return isinstance(value, list) and not isinstance(value, _Pairs)
+
+
+def _items(mapping):
+    if isinstance(mapping, _Pairs):
+        return list(mapping)
+    if isinstance(mapping, dict):
+        return list(mapping.items())
+    return []
+
+
+def parse_calories(value):
+    """
+    Extracts an integer calorie figure from values like 350, "350 kcal" or "approx. 1,850".
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(round(value))
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", str(value or ""))
+    return int(round(float(match.group().replace(",", "")))) if match else None
+
+
+def normalize_slot(name, taken):
+    """
+    Maps a meal heading to one of MEAL_SLOTS, or None. A bare "Snack" takes the first free snack slot.
+    """
+    name = name.lower()
+    words = set(re.findall(r"[a-z0-9]+", name))
+    if "breakfast" in name:
+        return "Breakfast"
+    if "lunch" in name:
+        return "Lunch"
+    if "dinner" in name or "supper" in name:
+        return "Dinner"
+    if "snack" in name:
+        if words & {"afternoon", "evening", "pm", "2", "second"}:
+            return "Afternoon Snack"
+        if words & {"morning", "am", "1", "first"}:
+            return "Morning Snack"
+        return "Morning Snack" if "Morning Snack" not in taken else "Afternoon Snack"
+    return None
+
+
+def _parse_meal(value):
+    if isinstance(value, str):
+        text, calories = value, None
+        match = re.search(r"\(?\s*(?:~|approx\.?\s*)?(\d[\d,]*)\s*(?:kcal|cal|calories)\s*\)?", text, re.I)
+        if match:
+            calories = parse_calories(match.group(1))
+            text = (text[:match.start()] + text[match.end():]).strip(" -,;")
+        items = [item.strip() for item in re.split(r",\s*|\s+and\s+|;\s*", text) if item.strip()]
+        return Meal(items=items, calories=calories)
+    if _is_array(value):
+        items, calories = [], 0
+        for entry in value:
+            meal = _parse_meal(entry)
+            items.extend(meal.items)
+            calories = calories + meal.calories if calories is not None and meal.calories is not None else None
+        return Meal(items=items, calories=calories or None)
+    meal = Meal()
+    for key, entry in _items(value):
+        key_lower = str(key).lower()
+        if "calor" in key_lower or key_lower in ("kcal", "cal"):
+            meal.calories = parse_calories(entry)
+        elif key_lower in ("items", "foods", "meal", "description", "name", "dish", "menu"):
+            meal.items.extend(_parse_meal(entry).items)
+    return meal
+
+
+def _parse_day(label, value):
+    day = DayPlan(label=str(label))
+    entries = _items(value)
+    # Accept either {"meals": {...}} or the meals directly on the day
+    nested = [entry for key, entry in entries if str(key).lower() == "meals"]
+    meal_entries = _items(nested[0]) if nested else entries
+    if nested and _is_array(nested[0]):
+        meal_entries = []
+        for meal in nested[0]:
+            fields = dict((str(k).lower(), v) for k, v in _items(meal))
+            meal_entries.append((fields.get("slot") or fields.get("type") or fields.get("name", ""), meal))
+    for key, entry in entries:
+        key_lower = str(key).lower()
+        if "total" in key_lower and "calor" in key_lower:
+            day.total_calories = parse_calories(entry)
+        elif key_lower in ("day", "label", "name") and isinstance(entry, str):
+            day.label = entry
+    for key, entry in meal_entries:
+        slot = normalize_slot(str(key), day.meals)
+        if slot and slot not in day.meals:
+            day.meals[slot] = _parse_meal(entry)
+    day.meals = {slot: day.meals[slot] for slot in MEAL_SLOTS if slot in day.meals}
+    if day.total_calories is None:
+        day.recompute_total()
+    return day
+
+
+def _plan_from_structure(data):
+    entries = _items(data)
+    days_value = dict((str(k).lower(), v) for k, v in entries).get("days") if entries else None
+    if days_value is not None:
+        data, entries = days_value, _items(days_value)
+    if _is_array(data):
+        days = [_parse_day(f"Day {i + 1}", entry) for i, entry in enumerate(data)]
+    else:
+        days = [_parse_day(key, entry) for key, entry in entries if _items(entry) or _is_array(entry)]
+    days = [day for day in days if day.meals]
+    return MealPlan(days=days) if days else None
+
+
+DAY_HEADING = re.compile(r"^\W*((?:day\s*\d+)|(?:" + "|".join(WEEKDAYS) + r"))\b[^\n]*$", re.I)
+MEAL_LINE = re.compile(r"^\W*([A-Za-z ]*(?:breakfast|lunch|dinner|supper|snack)[A-Za-z0-9 ]*)\s*[:\-]\s*(.+)$", re.I)
+TOTAL_LINE = re.compile(r"total[^:\n]*calor[^:\n]*[:\-]?\s*(.+)$", re.I)
+
+
+def _plan_from_text(text):
+    """
+    Fallback for plain-text plans with "Day N"/weekday headings and "Breakfast: ..." lines.
+    """
+    days = []
+    for line in text.splitlines():
+        total = TOTAL_LINE.search(line)
+        if total and days:
+            days[-1].total_calories = parse_calories(total.group(1))
+            continue
+        heading = DAY_HEADING.match(line)
+        meal_line = MEAL_LINE.match(line)
+        if heading and not meal_line:
+            days.append(DayPlan(label=heading.group(1).strip().title()))
+        elif meal_line and days:
+            slot = normalize_slot(meal_line.group(1), days[-1].meals)
+            if slot and slot not in days[-1].meals:
+                days[-1].meals[slot] = _parse_meal(meal_line.group(2))
+    for day in days:
+        day.meals = {slot: day.meals[slot] for slot in MEAL_SLOTS if slot in day.meals}
+        if day.total_calories is None:
+            day.recompute_total()
+    days = [day for day in days if day.meals]
+    return MealPlan(days=days) if days else None
+
+
+def parse_meal_plan(text):
+    """
+    Parses LLM output into a MealPlan, accepting strict JSON, JSON with common defects
+    (code fences, trailing commas, single quotes, duplicate "Snack" keys) or plain text.
+    Returns None if no day with at least one meal can be recovered.
+    """
+    data = _extract_structure(text)
+    plan = _plan_from_structure(data) if data is not None else None
+    return plan or _plan_from_text(text)
+
+
+def parse_meal(text):
+    """
+    Parses a single regenerated meal slot ({"items": [...], "calories": N}).
+    """
+    data = _extract_structure(text)
+    meal = _parse_meal(data if data is not None else text)
+    return meal if meal.items else None
+
+
+def parse_day(text, label):
+    """
+    Parses a single regenerated day, keeping `label` unless the output names the day itself.
+    """
+    data = _extract_structure(text)
+    if data is None:
+        plan = _plan_from_text(f"{label}\n{text}")
+        return plan.days[0] if plan else None
+    day = _parse_day(label, data)
+    return day if day.meals else None
+
+
+def _format_meal(meal):
+    text = ", ".join(meal.items)
+    return f"{text} ({meal.calories} kcal)" if meal.calories is not None else text
+
+
+def format_day(day):
+    total = f" ({day.total_calories} kcal)" if day.total_calories is not None else ""
+    lines = [f"**{day.label}**{total}"]
+    lines.extend(f"- {slot}: {_format_meal(meal)}" for slot, meal in day.meals.items())
+    return "\n".join(lines)
+
+
+def format_meal_plan(plan):
+    """
+    Renders the plan as compact markdown for the chat transcript.
+    """
+    return "\n\n".join(format_day(day) for day in plan.days)
+
+
+EDIT_WORDS = re.compile(
+    r"\b(swap|replace|change|substitute|switch|instead|different|update|modify|remove|add|make|redo|regenerate|without|less|more)\b",
+    re.I,
+)
+
+
+def find_edit_target(message, plan):
+    """
+    Returns (day index, slot or None) when `message` asks to change one day or one meal of `plan`,
+    or None if the request is not a targeted edit.
+    """
+    if not EDIT_WORDS.search(message):
+        return None
+    text = message.lower()
+    day_index = None
+    match = re.search(r"\bday\s*(\d+)\b", text)
+    if match:
+        day_index = int(match.group(1)) - 1
+    else:
+        for i, weekday in enumerate(WEEKDAYS):
+            if re.search(rf"\b{weekday}", text):
+                labels = [day.label.lower() for day in plan.days]
+                day_index = next((j for j, label in enumerate(labels) if weekday in label), i)
+                break
+    if day_index is None or not 0 <= day_index < len(plan.days):
+        return None
+    slot = None
+    for name in ("breakfast", "lunch", "dinner", "supper"):
+        if re.search(rf"\b{name}", text):
+            slot = normalize_slot(name, {})
+            break
+    else:
+        snack = re.search(r"(?:\b(?:morning|afternoon|evening|am|pm|first|second)\s+)?snacks?(?:\s*[12]\b)?", text)
+        if snack:
+            slot = normalize_slot(snack.group(), {})
+    return day_index, slot
@@ -0,0 +1,434 @@
+import argparse
+import csv
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+
+# ----------------------------------------------------------------
+# Bundled food composition table, deterministic plan nutrition and diet screening
+# ----------------------------------------------------------------
+
+DEFAULT_FOODS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "foods.csv")
+# Columns of the nutrient matrix; values are per 100 g
+NUTRIENTS = ["calories", "protein_g", "carbs_g", "fat_g"]
+_CSV_NUTRIENTS = ["kcal", "protein_g", "carbs_g", "fat_g"]
+
+# Grams per unit; counted units (slices, cups, ...) use the food's default portion instead
+UNIT_GRAMS = {"g": 1, "gram": 1, "grams": 1, "ml": 1, "oz": 28.35, "ounce": 28.35, "ounces": 28.35,
+              "tbsp": 15, "tablespoon": 15, "tablespoons": 15, "tsp": 5, "teaspoon": 5, "teaspoons": 5}
+QUANTITY = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(g|grams?|ml|oz|ounces?|tbsp|tablespoons?|tsp|teaspoons?|cups?|slices?|pieces?|servings?|scoops?)?"
+    r"\s+(?:of\s+)?(?:[a-z-]+\s+)?$"
+)
+
+
+class PatternMatcher:
+    """
+    Aho-Corasick automaton over a fixed set of lowercase terms.
+
+    Building is linear in the total length of the terms and each search is linear in the text
+    length plus the number of hits, however many terms there are. Hits must start and end on word
+    boundaries (a trailing plural "s"/"es" is allowed), and overlapping hits resolve leftmost-longest,
+    so "peanut butter" wins over "butter" and "eggplant" never matches "egg".
+    """
+
+    def __init__(self, terms):
+        # terms: iterable of (term, payload); a repeated term keeps its last payload
+        self.terms = []
+        self.payloads = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        ids = {}
+        for term, payload in terms:
+            term = " ".join(term.lower().split())
+            if not term:
+                continue
+            if term in ids:
+                self.payloads[ids[term]] = payload
+                continue
+            ids[term] = len(self.terms)
+            self.terms.append(term)
+            self.payloads.append(payload)
+            node = 0
+            for char in term:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._out[node].append(ids[term])
+        # Breadth-first pass sets failure links and merges the outputs reachable through them
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    @staticmethod
+    def _on_boundary(text, start, end):
+        if start > 0 and text[start - 1].isalnum():
+            return False
+        for suffix in ("", "s", "es"):
+            stop = end + len(suffix)
+            if text.startswith(suffix, end) and (stop == len(text) or not text[stop].isalnum()):
+                return True
+        return False
+
+    def find(self, text):
+        """
+        Returns non-overlapping hits in `text` as (start, end, term, payload), in order of position.
+        """
+        text = text.lower()
+        hits = []
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for term_id in self._out[node]:
+                start = position + 1 - len(self.terms[term_id])
+                if self._on_boundary(text, start, position + 1):
+                    hits.append((start, position + 1, term_id))
+        hits.sort(key=lambda hit: (hit[0], hit[0] - hit[1]))
+        result = []
+        covered = 0
+        for start, end, term_id in hits:
+            if start >= covered:
+                result.append((start, end, self.terms[term_id], self.payloads[term_id]))
+                covered = end
+        return result
+
+
+class NutritionDB:
+    """
+    The food composition table as NumPy arrays: a (foods x NUTRIENTS) matrix per 100 g and a
+    default portion per food, with a name/alias -> row index and a matcher for finding foods in text.
+    """
+
+    def __init__(self, names, nutrients, portions, tags, aliases=None):
+        self.names = list(names)
+        self.nutrients = nutrients
+        self.portions = portions
+        self.tags = [frozenset(food_tags) for food_tags in tags]
+        self.aliases = [list(food_aliases) for food_aliases in (aliases or [[] for _ in self.names])]
+        self.index = {}
+        for row, name in enumerate(self.names):
+            for term in [name] + self.aliases[row]:
+                self.index.setdefault(term.lower(), row)
+        self.matcher = PatternMatcher(self.index.items())
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_FOODS_PATH):
+        names, aliases, tags, portions, nutrients = [], [], [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                names.append(row["name"].strip())
+                aliases.append([alias.strip() for alias in row["aliases"].split(";") if alias.strip()])
+                tags.append([tag.strip() for tag in row["tags"].split(";") if tag.strip()])
+                portions.append(float(row["portion_g"]))
+                nutrients.append([float(row[column]) for column in _CSV_NUTRIENTS])
+        return cls(names, np.array(nutrients, dtype=np.float32), np.array(portions, dtype=np.float32), tags, aliases)
+
+    def save(self, directory):
+        """
+        Writes the table as .npy arrays plus a JSON index, for memory-mapped loading with load().
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "nutrients.npy"), np.asarray(self.nutrients, dtype=np.float32))
+        np.save(os.path.join(directory, "portions.npy"), np.asarray(self.portions, dtype=np.float32))
+        with open(os.path.join(directory, "foods.json"), "w", encoding="utf-8") as f:
+            json.dump({"names": self.names, "aliases": self.aliases, "tags": [sorted(t) for t in self.tags]}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Loads a table written by save(). With `mmap`, the arrays are memory-mapped rather than read
+        into memory, so large tables are shared between processes and only touched rows are paged in.
+        """
+        mode = "r" if mmap else None
+        nutrients = np.load(os.path.join(directory, "nutrients.npy"), mmap_mode=mode)
+        portions = np.load(os.path.join(directory, "portions.npy"), mmap_mode=mode)
+        with open(os.path.join(directory, "foods.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        return cls(index["names"], nutrients, portions, index["tags"], index["aliases"])
+
+    def lookup(self, name):
+        """
+        Returns the row for a food name or alias, or None.
+        """
+        return self.index.get(" ".join(name.lower().split()))
+
+    def match(self, text):
+        """
+        Finds the foods mentioned in `text` and returns (row, grams) for each. A number before the
+        food ("150 g salmon", "2 eggs", "1 tbsp honey") sets the amount; otherwise the default portion is used.
+        """
+        lowered = text.lower()
+        foods = []
+        for start, _, _, row in self.matcher.find(lowered):
+            grams = float(self.portions[row])
+            quantity = QUANTITY.search(lowered[:start])
+            if quantity:
+                amount, unit = float(quantity.group(1)), quantity.group(2)
+                grams = amount * UNIT_GRAMS[unit] if unit in UNIT_GRAMS else amount * grams
+            foods.append((row, grams))
+        return foods
+
+
+def load_nutrition_db(path=DEFAULT_FOODS_PATH):
+    """
+    Loads a CSV food table, or a memory-mapped table directory written by NutritionDB.save().
+    """
+    if os.path.isdir(path):
+        return NutritionDB.load(path)
+    return NutritionDB.from_csv(path)
+
+
+# ----------------------------------------------------------------
+# Deterministic calorie and macro totals
+# ----------------------------------------------------------------
+
+@dataclass
+class PlanNutrition:
+    meals: list  # (day index, slot) per row of meal_totals
+    meal_totals: np.ndarray  # (meals x NUTRIENTS)
+    day_totals: np.ndarray  # (days x NUTRIENTS)
+    matched_foods: np.ndarray  # recognised foods per meal
+    unmatched: list = field(default_factory=list)  # (day index, slot, item) with no recognised food
+
+
+def compute_plan_nutrition(plan, db):
+    """
+    Computes per-meal and per-day nutrient totals for a MealPlan in one batched pass: every
+    recognised food becomes one (meal, row, grams) entry, and the totals are two scatter-adds.
+    """
+    meals, meal_ids, rows, grams, unmatched = [], [], [], [], []
+    for day_index, day in enumerate(plan.days):
+        for slot, meal in day.meals.items():
+            meal_id = len(meals)
+            meals.append((day_index, slot))
+            for item in meal.items:
+                foods = db.match(item)
+                if not foods:
+                    unmatched.append((day_index, slot, item))
+                for row, amount in foods:
+                    meal_ids.append(meal_id)
+                    rows.append(row)
+                    grams.append(amount)
+
+    meal_ids = np.array(meal_ids, dtype=np.intp)
+    amounts = np.asarray(db.nutrients)[np.array(rows, dtype=np.intp)] * (np.array(grams, dtype=np.float32) / 100)[:, None]
+    meal_totals = np.zeros((len(meals), len(NUTRIENTS)))
+    np.add.at(meal_totals, meal_ids, amounts)
+    day_totals = np.zeros((len(plan.days), len(NUTRIENTS)))
+    np.add.at(day_totals, np.array([day_index for day_index, _ in meals], dtype=np.intp), meal_totals)
+    matched_foods = np.bincount(meal_ids, minlength=len(meals))
+    return PlanNutrition(meals, meal_totals, day_totals, matched_foods, unmatched)
+
+
+def apply_nutrition(plan, nutrition):
+    """
+    Replaces the LLM's calorie figures with computed ones wherever every item of a meal was
+    recognised. A day total is replaced only when all of its meals were.
+    """
+    unmatched_meals = {(day_index, slot) for day_index, slot, _ in nutrition.unmatched}
+    complete_days = set(range(len(plan.days)))
+    for (day_index, slot), totals, matched in zip(nutrition.meals, nutrition.meal_totals, nutrition.matched_foods):
+        if matched and (day_index, slot) not in unmatched_meals:
+            plan.days[day_index].meals[slot].calories = int(round(totals[0]))
+        else:
+            complete_days.discard(day_index)
+    for day_index in complete_days:
+        day = plan.days[day_index]
+        if day.meals:
+            day.total_calories = int(round(nutrition.day_totals[day_index, 0]))
+    return plan
+
+
+def format_nutrition(plan, nutrition):
+    """
+    Renders the per-day totals as a markdown table, noting items the table does not cover.
+    """
+    lines = ["| Day | kcal | Protein (g) | Carbs (g) | Fat (g) |", "|---|---:|---:|---:|---:|"]
+    for day, totals in zip(plan.days, nutrition.day_totals):
+        lines.append(f"| {day.label} | " + " | ".join(f"{value:.0f}" for value in totals) + " |")
+    note = "_Computed from the bundled food table."
+    if nutrition.unmatched:
+        items = sorted({item for _, _, item in nutrition.unmatched})
+        shown = ", ".join(items[:5]) + (", ..." if len(items) > 5 else "")
+        note += f" Not in the table, so not counted: {shown}."
+    return "\n".join(lines) + "\n\n" + note + "_"
+
+
+# ----------------------------------------------------------------
+# Allergen and dietary restriction screening
+# ----------------------------------------------------------------
+
+# Allergy wording -> food tags in the table
+ALLERGEN_TAGS = {
+    "peanut": {"peanut"}, "peanuts": {"peanut"}, "groundnut": {"peanut"},
+    "nut": {"tree_nut", "peanut"}, "nuts": {"tree_nut", "peanut"}, "tree nut": {"tree_nut"}, "tree nuts": {"tree_nut"},
+    "dairy": {"dairy"}, "milk": {"dairy"}, "lactose": {"dairy"},
+    "egg": {"egg"}, "eggs": {"egg"},
+    "gluten": {"gluten"}, "wheat": {"gluten"},
+    "soy": {"soy"}, "soya": {"soy"},
+    "fish": {"fish"}, "shellfish": {"shellfish"}, "seafood": {"fish", "shellfish"},
+    "sesame": {"sesame"},
+}
+# Dietary restriction wording -> food tags it excludes
+RESTRICTION_TAGS = {
+    "vegan": {"meat", "poultry", "fish", "shellfish", "dairy", "egg", "honey"},
+    "vegetarian": {"meat", "poultry", "fish", "shellfish"},
+    "pescatarian": {"meat", "poultry"},
+    "gluten": {"gluten"}, "celiac": {"gluten"}, "coeliac": {"gluten"},
+    "dairy": {"dairy"}, "lactose": {"dairy"},
+    "halal": {"pork", "alcohol"},
+    "kosher": {"pork", "shellfish"},
+    "nut": {"tree_nut", "peanut"},
+    "alcohol": {"alcohol"},
+}
+NO_ALLERGIES = {"", "none", "no", "n/a", "na", "nil", "nothing", "-"}
+ALLERGEN_TAG_SET = frozenset().union(*ALLERGEN_TAGS.values())
+# Words around an allergen that do not name a food ("severe peanut allergy", "I'm allergic to nuts")
+ALLERGY_FILLER_WORDS = {
+    "allergy", "allergies", "allergic", "intolerance", "intolerant", "intolerances", "sensitivity", "sensitive",
+    "anaphylaxis", "anaphylactic", "reaction", "reactions", "severe", "severely", "mild", "mildly", "very",
+    "i", "i'm", "im", "am", "have", "has", "to", "of", "a", "an", "the", "my", "all", "any", "kinds", "with",
+}
+
+
+@lru_cache(maxsize=8)
+def _allergy_matcher(db):
+    """
+    Matcher over allergen wording and food names/aliases, for reading free-text allergy entries.
+    Payloads are ("allergen", tags) or ("food", row); allergen wording wins where both exist.
+    """
+    terms = [(term, ("food", row)) for term, row in db.index.items()]
+    terms.extend((term, ("allergen", frozenset(tags))) for term, tags in ALLERGEN_TAGS.items())
+    return PatternMatcher(terms)
+
+
+@dataclass(frozen=True)
+class Violation:
+    day: str
+    slot: str
+    item: str
+    term: str
+    reason: str
+
+
+class DietScreener:
+    """
+    Flags plan items that conflict with a profile's allergies or dietary restrictions.
+
+    Allergy text is scanned for allergen wording and food names ("severe peanut allergy" finds
+    "peanut"); allergens and restrictions map to food tags and are screened with the table's matcher,
+    while other foods and leftover words ("strawberries", "kiwi") get a small matcher of their own. Each item is
+    scanned once per matcher, in time linear in its length.
+    """
+
+    def __init__(self, db, allergies="", dietary_restrictions=""):
+        self.db = db
+        self.forbidden_tags = {}  # tag -> reason
+        custom_terms = []
+        # Every allergen or food named anywhere in an entry counts; only the words left over
+        # (e.g. "kiwi" in "severe kiwi allergy") are screened as a custom term
+        allergies = allergies.lower()
+        if " ".join(allergies.split()).strip(".!") in NO_ALLERGIES:
+            allergies = ""
+        for phrase in re.split(r"[,;/&()\n]|\band\b|\bor\b", allergies):
+            if " ".join(phrase.split()).strip(".!") in NO_ALLERGIES:
+                continue
+            leftover = phrase
+            for start, end, term, (kind, value) in _allergy_matcher(db).find(phrase):
+                leftover = leftover[:start] + " " * (end - start) + leftover[end:]
+                tags = value if kind == "allergen" else db.tags[value] & ALLERGEN_TAG_SET
+                if not tags:
+                    # A food without allergen tags (e.g. "strawberries") is screened by name
+                    custom_terms.append(term)
+                for tag in tags:
+                    self.forbidden_tags.setdefault(tag, f"allergy: {term}")
+            words = [word for word in re.findall(r"[a-z][a-z']*", leftover) if word not in ALLERGY_FILLER_WORDS]
+            if words:
+                custom_terms.append(" ".join(words))
+        restrictions = dietary_restrictions.lower()
+        for word, tags in RESTRICTION_TAGS.items():
+            if re.search(rf"\b{word}", restrictions):
+                for tag in tags:
+                    self.forbidden_tags.setdefault(tag, word)
+        # Singular and plural forms, since only a trailing "s"/"es" is matched implicitly
+        variants = []
+        for term in custom_terms:
+            variants.append((term, f"allergy: {term}"))
+            if term.endswith("ies"):
+                variants.append((term[:-3] + "y", f"allergy: {term}"))
+            elif term.endswith("y"):
+                variants.append((term[:-1] + "ies", f"allergy: {term}"))
+            elif term.endswith("s") and not term.endswith("ss"):
+                variants.append((term[:-1], f"allergy: {term}"))
+        self.custom_matcher = PatternMatcher(variants) if variants else None
+
+    def screen_text(self, text):
+        """
+        Returns (matched term, reason) for each conflict found in `text`.
+        """
+        conflicts = []
+        if self.forbidden_tags:
+            for _, _, term, row in self.db.matcher.find(text):
+                tags = sorted(self.db.tags[row] & self.forbidden_tags.keys())
+                if tags:
+                    conflicts.append((term, self.forbidden_tags[tags[0]]))
+        if self.custom_matcher is not None:
+            conflicts.extend((term, reason) for _, _, term, reason in self.custom_matcher.find(text))
+        return conflicts
+
+    def screen(self, plan):
+        """
+        Returns a Violation for each conflicting item of a MealPlan.
+        """
+        violations = []
+        for day in plan.days:
+            for slot, meal in day.meals.items():
+                for item in meal.items:
+                    violations.extend(Violation(day.label, slot, item, term, reason) for term, reason in self.screen_text(item))
+        return violations
+
+
+@lru_cache(maxsize=256)
+def get_screener(db, allergies="", dietary_restrictions=""):
+    """
+    Returns a DietScreener for one combination of profile fields, built once and reused.
+    """
+    return DietScreener(db, allergies or "", dietary_restrictions or "")
+
+
+def format_violations(violations):
+    lines = ["**Please check: these items may conflict with your allergies or dietary restrictions.**"]
+    lines.extend(f"- {v.day}, {v.slot}: {v.item} ({v.term}; {v.reason})" for v in violations)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Converts a food CSV into a memory-mappable table directory.")
+    parser.add_argument("csv", nargs="?", default=DEFAULT_FOODS_PATH, help="food composition CSV")
+    parser.add_argument("output", help="directory to write nutrients.npy, portions.npy and foods.json to")
+    args = parser.parse_args(argv)
+    db = NutritionDB.from_csv(args.csv)
+    db.save(args.output)
+    print(f"Wrote {len(db.names)} foods to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# ----------------------------------------------------------------
+# Two-tier (memory + SQLite) cache for generated plans
+# ----------------------------------------------------------------
+
+# Keys that change on every save but do not affect the generated plan.
+IGNORED_PROFILE_KEYS = {"timestamp"}
+
+
+def _canonical_value(value):
+    """
+    Normalizes a single profile value so that equivalent inputs map to the same key.
+    """
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def canonicalize(data):
+    """
+    Returns a sorted, whitespace-normalized copy of a profile/prefs dict without volatile keys.
+    """
+    if not data:
+        return {}
+    return {
+        key: _canonical_value(value)
+        for key, value in sorted(data.items())
+        if key not in IGNORED_PROFILE_KEYS
+    }
+
+
+def make_cache_key(kind, model, prompt_version, user_profile, workout_prefs=None):
+    """
+    Builds a stable cache key from the plan kind, model, prompt template version and inputs.
+    """
+    payload = {
+        "kind": kind,
+        "model": model,
+        "prompt_version": prompt_version,
+        "user_profile": canonicalize(user_profile),
+        "workout_prefs": canonicalize(workout_prefs),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class PlanCache:
+    """
+    An in-process LRU tier in front of an on-disk SQLite tier.
+
+    Entries expire after `ttl_seconds`. The memory tier holds at most `max_memory_entries`
+    plans and the disk tier at most `max_disk_entries`; the least recently used entries
+    are evicted first. Safe to share between Streamlit session threads.
+    """
+
+    def __init__(self, db_path="plan_cache.sqlite3", max_memory_entries=256,
+                 max_disk_entries=10000, ttl_seconds=7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS plans_last_access ON plans (last_access)")
+        self._conn.commit()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, key):
+        """
+        Returns the cached plan for `key`, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, created_at FROM plans WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                value, created_at = row
+                if not self._expired(created_at, now):
+                    self._conn.execute("UPDATE plans SET last_access = ? WHERE key = ?", (now, key))
+                    self._conn.commit()
+                    self._remember(key, value, created_at)
+                    self._stats["disk_hits"] += 1
+                    return value
+                self._conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+                self._conn.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        """
+        Stores a plan in both tiers and evicts expired or least recently used entries.
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plans (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.ttl_seconds is not None:
+                self._conn.execute("DELETE FROM plans WHERE created_at < ?", (now - self.ttl_seconds,))
+            overflow = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0] - self.max_disk_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM plans WHERE key IN (SELECT key FROM plans ORDER BY last_access LIMIT ?)",
+                    (overflow,),
+                )
+                self._stats["evictions"] += overflow
+            self._conn.commit()
+
+    def get_or_create(self, key, create):
+        """
+        Returns the cached plan for `key`, calling `create()` and storing its result on a miss.
+        """
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM plans")
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Returns hit/miss counters plus the current size of each tier.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
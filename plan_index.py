@@ -0,0 +1,217 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# ----------------------------------------------------------------
+# Nearest-neighbour index for reusing plans generated for similar profiles
+# ----------------------------------------------------------------
+
+# Differences of about one scale unit (cm or kg) count as one unit of distance
+NUMERIC_SCALES = {
+    "height": 8.0,
+    "current_weight": 6.0,
+    "goal_weight": 6.0,
+    "waist_circumference": 8.0,
+    "hip_circumference": 8.0,
+}
+CATEGORICAL_VALUES = {
+    "gender": ["Male", "Female", "Other"],
+    "body_shape": ["Apple", "Pear", "Hourglass", "Rectangle", "Inverted Triangle", "Not Selected"],
+    "nutritional_goal": ["Weight Loss", "Muscle Gain", "Maintenance", "Other"],
+}
+# Free-text fields embedded locally with feature hashing
+TEXT_FIELDS = ["ingredient_preferences"]
+TEXT_DIMENSIONS = 64
+# Plans are only ever reused between profiles with the same allergies and restrictions
+CONSTRAINT_FIELDS = ["dietary_restrictions", "allergies"]
+_FILLER_WORDS = {"and", "or", "a", "an", "the", "to", "of"}
+
+
+def embed_text(text, dimensions=TEXT_DIMENSIONS):
+    """
+    Embeds free text as a unit-length hashed bag of words, so similar wording lands close together
+    without a model download.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in re.findall(r"[a-z]+", str(text or "").lower()):
+        if word in _FILLER_WORDS:
+            continue
+        digest = zlib.crc32(word.encode("utf-8"))
+        vector[digest % dimensions] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def encode_profile(profile, text_weight=0.5):
+    """
+    Encodes a profile as one float vector: scaled numeric fields, one-hot categorical fields
+    (unknown values share an "other" slot) and, if `text_weight` is non-zero, text embeddings.
+    """
+    parts = [np.array([float(profile.get(name) or 0) / scale for name, scale in NUMERIC_SCALES.items()])]
+    for name, values in CATEGORICAL_VALUES.items():
+        one_hot = np.zeros(len(values) + 1)
+        value = profile.get(name)
+        one_hot[values.index(value) if value in values else len(values)] = 1.0
+        parts.append(one_hot)
+    if text_weight:
+        parts.extend(text_weight * embed_text(profile.get(name, "")) for name in TEXT_FIELDS)
+    return np.concatenate(parts).astype(np.float32)
+
+
+def constraint_key(profile):
+    """
+    Normalizes the hard constraints so that "Peanuts, shellfish" and "shellfish and peanuts" match.
+    """
+    return "|".join(
+        " ".join(sorted(set(re.findall(r"[a-z]+", str(profile.get(name) or "").lower())) - _FILLER_WORDS))
+        for name in CONSTRAINT_FIELDS
+    )
+
+
+class _Partition:
+    """
+    Vectors of one partition in a matrix grown by doubling, so appends are amortized O(1).
+    """
+
+    def __init__(self, dimensions):
+        self.vectors = np.empty((16, dimensions), dtype=np.float32)
+        self.plans = []
+
+    def append(self, vector, plan):
+        if len(self.plans) == len(self.vectors):
+            grown = np.empty((2 * len(self.vectors), self.vectors.shape[1]), dtype=np.float32)
+            grown[:len(self.plans)] = self.vectors
+            self.vectors = grown
+        self.vectors[len(self.plans)] = vector
+        self.plans.append(plan)
+
+    def snapshot(self):
+        # Rows up to the current count are never rewritten, so the view stays valid during later appends
+        count = len(self.plans)
+        return self.vectors[:count], self.plans[:count]
+
+
+class PlanIndex:
+    """
+    Stores generated plans with an encoded profile and finds the most similar earlier profile.
+
+    Entries are partitioned by plan kind, model, prompt version and hard constraints, and each
+    partition keeps its vectors in one NumPy matrix, so a lookup is a single vectorized distance
+    computation plus a top-k partition. Similarity is exp(-distance^2 / 2), 1.0 for identical
+    profiles. The index is persisted in SQLite; the newest `max_entries` plans are kept on disk
+    and loaded into memory on the first lookup.
+    """
+
+    def __init__(self, db_path="plan_index.sqlite3", threshold=0.85, k=5, text_weight=0.5, max_entries=10000):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.k = k
+        self.text_weight = text_weight
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._partitions = {}  # partition key -> _Partition
+        self._stats = {"lookups": 0, "reused": 0, "adapted": 0, "misses": 0}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS indexed_plans ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " partition TEXT NOT NULL,"
+            " profile TEXT NOT NULL,"
+            " plan TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._loaded = False
+
+    def _load(self):
+        """
+        Reads the stored plans into memory on first use, so opening the index costs nothing at startup.
+        Must be called with the lock held.
+        """
+        if self._loaded:
+            return
+        rows = self._conn.execute(
+            "SELECT partition, profile, plan FROM indexed_plans ORDER BY id DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        for partition, profile, plan in reversed(rows):
+            self._append(partition, encode_profile(json.loads(profile), self.text_weight), plan)
+        self._loaded = True
+
+    @staticmethod
+    def partition_key(kind, model, prompt_version, profile):
+        return f"{kind}|{model}|{prompt_version}|{constraint_key(profile)}"
+
+    def _append(self, partition, vector, plan):
+        if partition not in self._partitions:
+            self._partitions[partition] = _Partition(len(vector))
+        self._partitions[partition].append(vector, plan)
+
+    def search(self, partition, profile, k=None):
+        """
+        Returns up to `k` (similarity, plan) pairs from `partition`, most similar first.
+        """
+        query = encode_profile(profile, self.text_weight)
+        with self._lock:
+            self._load()
+            if partition not in self._partitions:
+                return []
+            vectors, plans = self._partitions[partition].snapshot()
+        if not plans:
+            return []
+        distances = np.sum((vectors - query) ** 2, axis=1)
+        k = min(k or self.k, len(plans))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [(float(np.exp(-distances[i] / 2)), plans[i]) for i in nearest]
+
+    def find(self, partition, profile):
+        """
+        Returns (similarity, plan) for the nearest stored plan if it clears the threshold, else None.
+        """
+        matches = self.search(partition, profile, k=1)
+        return matches[0] if matches and matches[0][0] >= self.threshold else None
+
+    def record(self, outcome):
+        """
+        Counts one lookup by outcome: "reused" (served as is), "adapted" or "misses" (generated afresh).
+        """
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats[outcome] += 1
+
+    def add(self, partition, profile, plan):
+        """
+        Indexes a newly generated plan for `profile`.
+        """
+        vector = encode_profile(profile, self.text_weight)
+        with self._lock:
+            self._load()
+            self._append(partition, vector, plan)
+            self._conn.execute(
+                "INSERT INTO indexed_plans (partition, profile, plan, created_at) VALUES (?, ?, ?, ?)",
+                (partition, json.dumps(profile, default=str), plan, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM indexed_plans WHERE id <= (SELECT MAX(id) FROM indexed_plans) - ?", (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Returns lookup counters, the reuse rate and the number of indexed plans.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            if self._loaded:
+                stats["entries"] = sum(len(partition.plans) for partition in self._partitions.values())
+            else:
+                stats["entries"] = min(self._conn.execute("SELECT COUNT(*) FROM indexed_plans").fetchone()[0],
+                                       self.max_entries)
+        served = stats["reused"] + stats["adapted"]
+        stats["reuse_rate"] = served / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
@@ -0,0 +1,303 @@
+import copy
+import re
+
+from meal_plan import MealPlan, find_edit_target, format_day, parse_day, parse_meal, parse_meal_plan
+from nutrition import PatternMatcher, apply_nutrition, compute_plan_nutrition
+from plan_cache import make_cache_key
+
+# ----------------------------------------------------------------
+# Model and Prompt Template Versions
+# ----------------------------------------------------------------
+
+MODEL_NAME = "command-xlarge"
+# Bump these whenever the corresponding prompt template changes so stale cached plans are not served.
+MEAL_PLAN_PROMPT_VERSION = 2
+WORKOUT_PLAN_PROMPT_VERSION = 1
+
+# Output budgets for targeted meal plan edits (a full 7-day plan uses up to 2000 tokens)
+MEAL_SLOT_MAX_TOKENS = 150
+MEAL_DAY_MAX_TOKENS = 400
+
+# ----------------------------------------------------------------
+# LLM Utility Functions (independent of the Streamlit UI)
+# ----------------------------------------------------------------
+
+def generate_weekly_meal_plan(user_profile, gateway, plan_cache=None, plan_index=None):
+    """
+    Generates an initial 7-day meal plan based on user profile.
+    Identical profiles (ignoring the timestamp) are served from `plan_cache` if one is given.
+    With a `plan_index` (a PlanIndex), the plan of a sufficiently similar earlier profile with the
+    same allergies and restrictions is adapted instead, and new plans are added to the index.
+    """
+    cache_key = make_cache_key("meal_plan", MODEL_NAME, MEAL_PLAN_PROMPT_VERSION, user_profile)
+    cached_plan = plan_cache.get(cache_key) if plan_cache is not None else None
+    if cached_plan is not None:
+        return cached_plan
+
+    if plan_index is not None:
+        partition = plan_index.partition_key("meal_plan", MODEL_NAME, MEAL_PLAN_PROMPT_VERSION, user_profile)
+        match = plan_index.find(partition, user_profile)
+        plan = adapt_meal_plan(match[1], user_profile, gateway) if match is not None else None
+        if plan is not None:
+            plan_index.record("reused" if plan == match[1] else "adapted")
+            if plan_cache is not None:
+                plan_cache.set(cache_key, plan)
+            return plan
+        plan_index.record("misses")
+
+    prompt = f"""
+    You are a nutrition expert. Generate a 7-day meal plan for the following user profile:
+    
+    - Gender: {user_profile['gender']}
+    - Body Shape: {user_profile['body_shape']}
+    - Height (cm): {user_profile['height']}
+    - Current Weight (kg): {user_profile['current_weight']}
+    - Goal Weight (kg): {user_profile['goal_weight']}
+    - Waist Circumference (cm): {user_profile['waist_circumference']}
+    - Hip Circumference (cm): {user_profile['hip_circumference']}
+    - Dietary Restrictions: {user_profile['dietary_restrictions']}
+    - Nutritional Goal: {user_profile['nutritional_goal']}
+    - Ingredient Preferences: {user_profile['ingredient_preferences']}
+    - Allergies: {user_profile['allergies']}
+    
+    The meal plan should have 3 meals + 2 snacks per day (Breakfast, Morning Snack, Lunch, Afternoon Snack, Dinner).
+    Return only JSON in this structure, with a calorie estimate for every meal and a total for each day:
+    {{"days": [{{"day": "Day 1", "meals": {{"Breakfast": {{"items": ["..."], "calories": 0}}, ...}}, "total_calories": 0}}, ...]}}
+    """
+    plan = gateway.generate(prompt, MODEL_NAME, max_tokens=2000, temperature=0.7)
+    if plan_cache is not None:
+        plan_cache.set(cache_key, plan)
+    if plan_index is not None:
+        plan_index.add(partition, user_profile, plan)
+    return plan
+
+# A dislike runs from one of these verbs to the end of the clause. Bare "no"/"not" are left out:
+# they match far more often in "no preference" or "not picky" than before an ingredient.
+_DISLIKE_VERBS = (r"dislikes?|(?:don't|do not|doesn't|does not) like|hates?|avoids?|avoiding|can't stand"
+                  r"|not (?:a |a big |much of a )?fan of")
+DISLIKE_PHRASE = re.compile(
+    rf"\b(?:{_DISLIKE_VERBS})\s+([^.;!]+?)"
+    rf"(?=[.;!]|\b(?:{_DISLIKE_VERBS}|likes?|loves?|enjoys?|prefers?|because|since|but|except|though|although)\b|$)"
+)
+DISLIKE_FILLER_WORDS = {"please", "any", "all", "really", "very", "much", "too", "the", "a", "an", "of"}
+# Ingredient names are short; anything longer is a sentence the phrase pattern ran into
+MAX_DISLIKE_WORDS = 3
+
+def disliked_ingredients(preferences):
+    """
+    Extracts disliked ingredients from free text such as "likes lentils, dislikes mushrooms and olives".
+    """
+    terms = []
+    for phrase in DISLIKE_PHRASE.findall(str(preferences or "").lower()):
+        for term in re.split(r",|/|\band\b|\bor\b|\bnor\b", phrase):
+            words = [word for word in re.findall(r"[a-z][a-z'-]*", term) if word not in DISLIKE_FILLER_WORDS]
+            term = " ".join(words[:MAX_DISLIKE_WORDS])
+            if term and term not in terms:
+                terms.append(term)
+    return terms
+
+def adapt_meal_plan(plan_text, user_profile, gateway):
+    """
+    Adapts a plan generated for a similar profile: meals containing an ingredient this user
+    dislikes are regenerated one slot at a time, the rest is served unchanged.
+    Returns the plan text, or None if it needs adapting but cannot be parsed.
+    """
+    dislikes = disliked_ingredients(user_profile.get("ingredient_preferences"))
+    matcher = PatternMatcher((term, term) for term in dislikes)
+    if not dislikes or not matcher.find(plan_text):
+        return plan_text
+    plan = parse_meal_plan(plan_text)
+    if plan is None:
+        return None
+    for day in plan.days:
+        for slot, meal in list(day.meals.items()):
+            found = sorted({term for item in meal.items for _, _, term, _ in matcher.find(item)})
+            if found:
+                replacement = _regenerate_meal(day, slot, f"Replace the {slot}; I dislike {', '.join(found)}.",
+                                               user_profile, gateway)
+                if replacement is None:
+                    return None
+                day.meals[slot] = replacement
+        day.total_calories = None
+        day.recompute_total()
+    return plan.to_json()
+
+def chat_meal_plan(conversation, profile, context, gateway, stream=False, plan_text=None):
+    """
+    Uses the conversation history (including the profile info) to generate the next AI reply.
+    The prompt is kept within a token budget: the latest plan and recent turns are sent verbatim
+    and older turns are folded into a running summary held by `context` (a ChatContext).
+    `plan_text`, if given, is sent as the current plan instead of the latest plan message.
+    If `stream` is True, returns an iterator of text chunks instead of the full reply.
+    """
+    prompt = "You are a nutrition expert and conversational AI. Use the following user profile to inform your responses:\n"
+    if profile:
+        prompt += (
+            f"- Gender: {profile.get('gender', '')}\n"
+            f"- Body Shape: {profile.get('body_shape', '')}\n"
+            f"- Height (cm): {profile.get('height', '')}\n"
+            f"- Current Weight (kg): {profile.get('current_weight', '')}\n"
+            f"- Goal Weight (kg): {profile.get('goal_weight', '')}\n"
+            f"- Waist Circumference (cm): {profile.get('waist_circumference', '')}\n"
+            f"- Hip Circumference (cm): {profile.get('hip_circumference', '')}\n"
+            f"- Dietary Restrictions: {profile.get('dietary_restrictions', '')}\n"
+            f"- Nutritional Goal: {profile.get('nutritional_goal', '')}\n"
+            f"- Ingredient Preferences: {profile.get('ingredient_preferences', '')}\n"
+            f"- Allergies: {profile.get('allergies', '')}\n\n"
+        )
+    prompt += "The following is a conversation between a user and you about generating a meal plan.\n"
+    # Only unseen messages are added to the context; the last message is the new user turn.
+    context.sync(conversation, len(conversation) - 1)
+    if plan_text is not None:
+        context.pin_plan(plan_text)
+    prompt = context.build_prompt(prompt, conversation[-1])
+    if stream:
+        return gateway.stream(prompt, MODEL_NAME)
+    return gateway.generate(prompt, MODEL_NAME, max_tokens=2000, temperature=0.7)
+
+def _meal_constraints(profile):
+    return (
+        f"- Dietary Restrictions: {profile.get('dietary_restrictions', '')}\n"
+        f"- Allergies: {profile.get('allergies', '')}\n"
+        f"- Nutritional Goal: {profile.get('nutritional_goal', '')}\n"
+        f"- Ingredient Preferences: {profile.get('ingredient_preferences', '')}\n"
+    )
+
+def _regenerate_meal(day, slot, request, profile, gateway):
+    """
+    Asks for a replacement for one meal slot of `day` (a DayPlan); returns a Meal or None.
+    """
+    day_json = MealPlan(days=[day]).to_dict()["days"][0]
+    prompt = (
+        "You are a nutrition expert editing one meal of an existing meal plan.\n"
+        f"User constraints:\n{_meal_constraints(profile)}\n"
+        f"Current plan for {day.label}: {day_json}\n"
+        f"User request: {request}\n\n"
+        f"Return only JSON for the new {slot}: {{\"items\": [\"...\"], \"calories\": 0}}"
+    )
+    return parse_meal(gateway.generate(prompt, MODEL_NAME, max_tokens=MEAL_SLOT_MAX_TOKENS, temperature=0.7))
+
+def refine_meal_plan(plan, request, profile, gateway, nutrition_db=None):
+    """
+    Applies a targeted edit such as "swap Tuesday's lunch" by regenerating only the affected
+    meal slot or day and patching it into a copy of `plan` (a MealPlan).
+    With a `nutrition_db`, calories of the edited plan are recomputed from the food table.
+    Returns (updated plan, reply text), or None if the request does not target one day or meal
+    or the regenerated part cannot be parsed; callers then fall back to chat_meal_plan.
+    """
+    target = find_edit_target(request, plan)
+    if target is None:
+        return None
+    day_index, slot = target
+    updated = copy.deepcopy(plan)
+    day = updated.days[day_index]
+    day_json = updated.to_dict()["days"][day_index]
+
+    if slot is not None:
+        meal = _regenerate_meal(day, slot, request, profile, gateway)
+        if meal is None:
+            return None
+        day.meals[slot] = meal
+        day.total_calories = None
+        day.recompute_total()
+        heading = f"Here is the updated {slot} for {day.label}:"
+    else:
+        prompt = (
+            "You are a nutrition expert editing one day of an existing meal plan.\n"
+            f"User constraints:\n{_meal_constraints(profile)}\n"
+            f"Current plan for {day.label}: {day_json}\n"
+            f"User request: {request}\n\n"
+            "Return only JSON for the new day with all five meals (Breakfast, Morning Snack, Lunch, "
+            'Afternoon Snack, Dinner): {"Breakfast": {"items": ["..."], "calories": 0}, ..., "total_calories": 0}'
+        )
+        new_day = parse_day(gateway.generate(prompt, MODEL_NAME, max_tokens=MEAL_DAY_MAX_TOKENS, temperature=0.7), day.label)
+        if new_day is None:
+            return None
+        new_day.label = day.label
+        updated.days[day_index] = new_day
+        heading = f"Here is the updated plan for {day.label}:"
+    if nutrition_db is not None:
+        apply_nutrition(updated, compute_plan_nutrition(updated, nutrition_db))
+    return updated, f"{heading}\n\n{format_day(updated.days[day_index])}"
+
+def generate_workout_plan(user_profile, workout_prefs, gateway, plan_cache=None):
+    """
+    Generates an initial 7-day workout plan based on the user profile and workout preferences.
+    Identical inputs (ignoring the timestamp) are served from `plan_cache` if one is given.
+    """
+    cache_key = make_cache_key("workout_plan", MODEL_NAME, WORKOUT_PLAN_PROMPT_VERSION, user_profile, workout_prefs)
+    cached_plan = plan_cache.get(cache_key) if plan_cache is not None else None
+    if cached_plan is not None:
+        return cached_plan
+
+    prompt = f"""
+    You are a personal fitness coach. Based on the following user profile and workout preferences,
+    generate a 7-day workout plan. **Do not exceed {workout_prefs['days_per_week']} workout days.**
+    For the remaining {7 - workout_prefs['days_per_week']} days, label them as "Rest Day" or
+    "Active Recovery" days.
+
+    User Profile:
+    - Gender: {user_profile['gender']}
+    - Body Shape: {user_profile['body_shape']}
+    - Height (cm): {user_profile['height']}
+    - Current Weight (kg): {user_profile['current_weight']}
+    - Goal Weight (kg): {user_profile['goal_weight']}
+
+    Workout Preferences:
+    - Days per week: {workout_prefs['days_per_week']}
+    - Workout Style: {workout_prefs['workout_style']}
+    - Equipment Available: {workout_prefs['equipment']}
+    - Workout Location: {workout_prefs['location']}
+    - Session Duration (minutes): {workout_prefs['session_duration']}
+    - Other Notes: {workout_prefs['other_workout_notes']}
+
+    Return the plan in a structured format, for example:
+
+    Day 1:
+      - Warm-up:
+      - Main Workout:
+      - Cool-down:
+    Day 2:
+      ...
+    ...
+    Day 7:
+      ...
+
+    **Important**: You must provide exactly {workout_prefs['days_per_week']} workout days. The remaining days must be labeled as rest or active recovery.
+    """
+    plan = gateway.generate(prompt, MODEL_NAME, max_tokens=2000, temperature=0.7)
+    if plan_cache is not None:
+        plan_cache.set(cache_key, plan)
+    return plan
+
+def chat_workout_plan(conversation, profile, workout_prefs, context, gateway, stream=False):
+    """
+    Uses the conversation history (including user profile + workout prefs) to generate the next AI reply.
+    The prompt is budgeted the same way as in chat_meal_plan.
+    If `stream` is True, returns an iterator of text chunks instead of the full reply.
+    """
+    prompt = "You are a personal fitness coach and a conversational AI. Use the following user profile and workout preferences:\n"
+    if profile:
+        prompt += (
+            f"- Gender: {profile.get('gender', '')}\n"
+            f"- Body Shape: {profile.get('body_shape', '')}\n"
+            f"- Height (cm): {profile.get('height', '')}\n"
+            f"- Current Weight (kg): {profile.get('current_weight', '')}\n"
+            f"- Goal Weight (kg): {profile.get('goal_weight', '')}\n"
+        )
+    if workout_prefs:
+        prompt += (
+            f"- Days per week: {workout_prefs.get('days_per_week', '')}\n"
+            f"- Workout Style: {workout_prefs.get('workout_style', '')}\n"
+            f"- Equipment: {workout_prefs.get('equipment', '')}\n"
+            f"- Location: {workout_prefs.get('location', '')}\n"
+            f"- Session Duration: {workout_prefs.get('session_duration', '')} min\n"
+            f"- Other Notes: {workout_prefs.get('other_workout_notes', '')}\n\n"
+        )
+    prompt += "The following is a conversation between a user and you about generating or refining a workout plan.\n"
+    # Only unseen messages are added to the context; the last message is the new user turn.
+    context.sync(conversation, len(conversation) - 1)
+    prompt = context.build_prompt(prompt, conversation[-1])
+    if stream:
+        return gateway.stream(prompt, MODEL_NAME)
+    return gateway.generate(prompt, MODEL_NAME, max_tokens=2000, temperature=0.7)
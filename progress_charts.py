@@ -0,0 +1,104 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# ----------------------------------------------------------------
+# Vectorized Progress tab pipeline: derived metrics, downsampling, figure
+# ----------------------------------------------------------------
+
+# (column, chart title) for each trace of the progress figure
+PROGRESS_SERIES = [
+    ("current_weight", "Weight Progress (kg)"),
+    ("waist_circumference", "Waist Circumference Progress (cm)"),
+    ("hip_circumference", "Hip Circumference Progress (cm)"),
+    ("BMI", "BMI Progress"),
+]
+
+
+def add_derived_metrics(history_df):
+    """
+    Adds BMI using column arithmetic. The frame is expected to be sorted by timestamp already.
+    """
+    history_df = history_df.copy()
+    history_df["BMI"] = history_df["current_weight"] / (history_df["height"] / 100) ** 2
+    return history_df
+
+
+def _even_indices(n, max_points):
+    return np.unique(np.linspace(0, n - 1, max(max_points, 1)).round().astype(int))
+
+
+def minmax_indices(y, max_points):
+    """
+    Keeps both endpoints plus the minimum and maximum of each of `(max_points - 2) // 2` equal-sized
+    buckets, so at most `max_points` indices are returned. Budgets too small for one bucket
+    (`max_points < 4`) fall back to evenly spaced points.
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = (max_points - 2) // 2
+    if buckets < 1:
+        return _even_indices(n, max_points)
+    edges = np.linspace(1, n - 1, buckets + 1).astype(int)
+    keep = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            window = y[start:end]
+            keep.extend((start + int(np.nanargmin(window)), start + int(np.nanargmax(window))))
+    return np.unique(keep)
+
+
+def lttb_indices(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets: picks `max_points` indices that best preserve the visual shape of (x, y).
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 3:
+        return _even_indices(n, max_points)
+    x = x.astype(float)
+    y = y.astype(float)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    keep = np.empty(max_points, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    selected = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        next_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+        areas = np.abs(
+            (x[selected] - next_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (next_y - y[selected])
+        )
+        selected = start + int(np.nanargmax(areas)) if len(areas) else start
+        keep[i + 1] = selected
+    return np.unique(keep)
+
+
+def build_progress_figure(history_df, max_points=None, method="lttb"):
+    """
+    Builds one figure with a subplot per progress series.
+    If `max_points` is set, each series is downsampled to at most that many points.
+    """
+    fig = make_subplots(
+        rows=len(PROGRESS_SERIES), cols=1, shared_xaxes=True, vertical_spacing=0.06,
+        subplot_titles=[title for _, title in PROGRESS_SERIES],
+    )
+    timestamps = history_df["timestamp"].to_numpy()
+    x_numeric = timestamps.astype("datetime64[ns]").astype(np.int64)
+    for row, (column, title) in enumerate(PROGRESS_SERIES, start=1):
+        y = history_df[column].to_numpy(dtype=float)
+        if max_points:
+            keep = lttb_indices(x_numeric, y, max_points) if method == "lttb" else minmax_indices(y, max_points)
+            x_values, y_values = timestamps[keep], y[keep]
+        else:
+            x_values, y_values = timestamps, y
+        # WebGL traces keep long histories responsive in the browser
+        trace = go.Scattergl if len(y_values) > 1000 else go.Scatter
+        fig.add_trace(trace(x=x_values, y=y_values, mode="lines", name=title), row=row, col=1)
+    fig.update_layout(height=260 * len(PROGRESS_SERIES), showlegend=False, margin=dict(t=40, b=20))
+    return fig
@@ -0,0 +1,169 @@
+import math
+import sqlite3
+import threading
+from datetime import datetime
+
+# ----------------------------------------------------------------
+# Durable, per-user store for profile measurements
+# ----------------------------------------------------------------
+
+NUMERIC_COLUMNS = {"height", "current_weight", "goal_weight", "waist_circumference", "hip_circumference"}
+MEASUREMENT_COLUMNS = [
+    "timestamp", "gender", "body_shape", "height", "current_weight", "goal_weight", "waist_circumference",
+    "hip_circumference", "dietary_restrictions", "nutritional_goal", "ingredient_preferences", "allergies",
+]
+# Fields tracked for the first and latest measurement of each user
+SUMMARY_FIELDS = ["timestamp", "height", "current_weight", "waist_circumference", "hip_circumference"]
+# Body measurements that must be finite and positive (BMI divides by the height)
+POSITIVE_FIELDS = ["height", "current_weight", "waist_circumference", "hip_circumference"]
+
+
+def format_timestamp(value):
+    """
+    Normalizes a datetime, date or timestamp string to "YYYY-MM-DD HH:MM:SS".
+    Common ISO forms are parsed without pandas, which is only imported for other formats.
+    """
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        return datetime.fromisoformat(str(value).strip()).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        import pandas as pd
+
+        return pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def bmi(weight, height_cm):
+    return weight / ((height_cm / 100) ** 2)
+
+
+class ProgressStore:
+    """
+    Stores every saved profile as a measurement row in SQLite, indexed by (user_id, timestamp).
+
+    A per-user summary row (count, first and latest measurement) is updated on every insert,
+    so summary metrics never need a scan of the history. Timestamps are stored as
+    "YYYY-MM-DD HH:MM:SS" strings, which sort chronologically.
+    """
+
+    def __init__(self, db_path="progress.sqlite3"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        columns = ", ".join(f"{name} {'REAL' if name in NUMERIC_COLUMNS else 'TEXT'}" for name in MEASUREMENT_COLUMNS)
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS measurements (user_id TEXT NOT NULL, {columns})")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS measurements_user_time ON measurements (user_id, timestamp)"
+        )
+        summary_columns = ", ".join(f"{prefix}_{field}" for prefix in ("first", "latest") for field in SUMMARY_FIELDS)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS summaries (user_id TEXT PRIMARY KEY, measurements INTEGER, {summary_columns})"
+        )
+        self._conn.commit()
+
+    def _load_summary(self, user_id):
+        cursor = self._conn.execute("SELECT * FROM summaries WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([col[0] for col in cursor.description], row))
+
+    def _fold(self, summary, user_id, measurement):
+        """
+        Updates a summary dict with one new measurement in O(1).
+        """
+        if summary is None:
+            summary = {"user_id": user_id, "measurements": 0}
+            summary.update({f"first_{field}": measurement[field] for field in SUMMARY_FIELDS})
+            summary.update({f"latest_{field}": measurement[field] for field in SUMMARY_FIELDS})
+        elif measurement["timestamp"] < summary["first_timestamp"]:
+            summary.update({f"first_{field}": measurement[field] for field in SUMMARY_FIELDS})
+        elif measurement["timestamp"] >= summary["latest_timestamp"]:
+            summary.update({f"latest_{field}": measurement[field] for field in SUMMARY_FIELDS})
+        summary["measurements"] += 1
+        return summary
+
+    def _save_summary(self, summary):
+        columns = list(summary)
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO summaries ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [summary[col] for col in columns],
+        )
+
+    def add_many(self, user_id, measurements):
+        """
+        Inserts measurements for one user in a single transaction (used for saves and bulk imports).
+        Each measurement is a profile dict; the SUMMARY_FIELDS are required, other fields default to "".
+        Raises ValueError, storing nothing, if any measurement is incomplete or not a positive number.
+        """
+        rows = []
+        with self._lock:
+            summary = self._load_summary(user_id)
+            for measurement in measurements:
+                measurement = {col: measurement.get(col, "") for col in MEASUREMENT_COLUMNS}
+                missing = [field for field in SUMMARY_FIELDS if measurement[field] in ("", None)]
+                if missing:
+                    raise ValueError(f"Measurement is missing {', '.join(missing)}.")
+                measurement["timestamp"] = format_timestamp(measurement["timestamp"])
+                for col in NUMERIC_COLUMNS:
+                    measurement[col] = float(measurement[col]) if measurement[col] != "" else None
+                invalid = [field for field in POSITIVE_FIELDS
+                           if not math.isfinite(measurement[field]) or measurement[field] <= 0]
+                if invalid:
+                    raise ValueError(f"Measurement has a non-positive {', '.join(invalid)}.")
+                rows.append([user_id] + [measurement[col] for col in MEASUREMENT_COLUMNS])
+                summary = self._fold(summary, user_id, measurement)
+            if not rows:
+                return 0
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT INTO measurements (user_id, {', '.join(MEASUREMENT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(MEASUREMENT_COLUMNS) + 1))})",
+                    rows,
+                )
+                self._save_summary(summary)
+        return len(rows)
+
+    def add(self, user_id, measurement):
+        return self.add_many(user_id, [measurement])
+
+    def query(self, user_id, start=None, end=None):
+        """
+        Returns the user's measurements between `start` and `end` (inclusive, either may be None)
+        as a DataFrame sorted by timestamp. Only rows in the window are read.
+        """
+        import pandas as pd
+
+        sql = f"SELECT {', '.join(MEASUREMENT_COLUMNS)} FROM measurements WHERE user_id = ?"
+        params = [user_id]
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            params.append(format_timestamp(start))
+        if end is not None:
+            sql += " AND timestamp <= ?"
+            params.append(format_timestamp(end))
+        sql += " ORDER BY timestamp"
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params, parse_dates=["timestamp"])
+
+    def summary(self, user_id):
+        """
+        Returns the first and latest measurement, with BMI and deltas, or None if the user has no history.
+        """
+        with self._lock:
+            row = self._load_summary(user_id)
+        if row is None:
+            return None
+        first = {field: row[f"first_{field}"] for field in SUMMARY_FIELDS}
+        latest = {field: row[f"latest_{field}"] for field in SUMMARY_FIELDS}
+        first["BMI"] = bmi(first["current_weight"], first["height"])
+        latest["BMI"] = bmi(latest["current_weight"], latest["height"])
+        return {
+            "measurements": row["measurements"],
+            "first": first,
+            "latest": latest,
+            "delta": {
+                field: latest[field] - first[field]
+                for field in ("current_weight", "waist_circumference", "hip_circumference", "BMI")
+            },
+        }
@@ -0,0 +1,125 @@
+"""
+Cold-start timing for the Streamlit app.
+
+app.py marks phases of the first script run in each server process (imports, first paint) and
+measures lazy imports the first time a tab needs them. New timings are appended as JSON lines to
+$STARTUP_TIMINGS_PATH (default startup_timings.jsonl), tagged with $APP_RELEASE, so they can be
+compared across releases:
+
+    python startup_timing.py                      # median per phase for each release
+    python startup_timing.py startup_timings.jsonl
+"""
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_PATH = "startup_timings.jsonl"
+
+_lock = threading.Lock()
+_run_start = None
+_phases = {}  # phase -> seconds, each recorded once per process
+_unreported = []
+
+
+def start_run():
+    """
+    Called at the top of every script run; only the first run of the process is timed.
+    """
+    global _run_start
+    if _run_start is None:
+        _run_start = time.perf_counter()
+
+
+def mark(phase):
+    """
+    Records the time from the start of the first script run to now, the first time `phase` is reached.
+    """
+    with _lock:
+        if _run_start is not None and phase not in _phases:
+            _phases[phase] = time.perf_counter() - _run_start
+            _unreported.append(phase)
+
+
+@contextmanager
+def measure(phase):
+    """
+    Records how long the enclosed block takes the first time it runs in this process (e.g. a lazy import).
+    """
+    if phase in _phases:
+        yield
+        return
+    start = time.perf_counter()
+    yield
+    with _lock:
+        if phase not in _phases:
+            _phases[phase] = time.perf_counter() - start
+            _unreported.append(phase)
+
+
+def timings():
+    with _lock:
+        return dict(_phases)
+
+
+def report(path=None):
+    """
+    Appends phases recorded since the last report as one JSON line. Returns the written record or None.
+    """
+    with _lock:
+        if not _unreported:
+            return None
+        record = {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "release": os.environ.get("APP_RELEASE", "dev"),
+            "pid": os.getpid(),
+            "phases": {phase: round(_phases[phase], 4) for phase in _unreported},
+        }
+        _unreported.clear()
+    try:
+        with open(path or os.environ.get("STARTUP_TIMINGS_PATH", DEFAULT_PATH), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        # Timing is diagnostic only; a read-only deployment must still serve the app
+        return None
+    return record
+
+
+def summarize(path=DEFAULT_PATH):
+    """
+    Returns {release: {phase: (median seconds, samples)}} from a timings file.
+    """
+    samples = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            for phase, seconds in record.get("phases", {}).items():
+                samples.setdefault(record.get("release", "dev"), {}).setdefault(phase, []).append(seconds)
+    return {
+        release: {phase: (statistics.median(values), len(values)) for phase, values in phases.items()}
+        for release, phases in samples.items()
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else os.environ.get("STARTUP_TIMINGS_PATH", DEFAULT_PATH)
+    if not os.path.exists(path):
+        print(f"No startup timings recorded yet ({path}).", file=sys.stderr)
+        return 1
+    for release, phases in summarize(path).items():
+        print(f"release {release}")
+        print(f"  {'phase':<40}{'median (s)':>12}{'n':>6}")
+        for phase, (median, count) in sorted(phases.items(), key=lambda item: item[1][0]):
+            print(f"  {phase:<40}{median:>12.3f}{count:>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
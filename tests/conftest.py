@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_gateway():
+    """
+    Returns a factory for gateways with rate limiting effectively disabled, around `backend` or an
+    instant MockBackend.
+    """
+    from llm_backends import MockBackend
+    from llm_gateway import LLMGateway
+
+    def make(backend=None):
+        backend = backend or MockBackend(latency=0, tokens_per_second=1e6)
+        return LLMGateway(backend, requests_per_second=1e6, burst=1e6)
+    return make
+
+
+@pytest.fixture
+def gateway(make_gateway):
+    return make_gateway()
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from batch_generate import run_batch
+
+PROFILE = {
+    "gender": "Female", "body_shape": "Pear", "height": 165, "current_weight": 70, "goal_weight": 62,
+    "waist_circumference": 78, "hip_circumference": 102, "dietary_restrictions": "",
+    "nutritional_goal": "Weight Loss", "ingredient_preferences": "", "allergies": "",
+}
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return {record["id"]: record for record in map(json.loads, f)}
+
+
+def test_bad_rows_are_recorded_and_do_not_stop_the_run(tmp_path, gateway):
+    input_path, output_path = tmp_path / "profiles.jsonl", tmp_path / "plans.jsonl"
+    input_path.write_text("\n".join([
+        json.dumps(dict(PROFILE, id="a")),
+        json.dumps(dict(PROFILE, id="bad-height", height="x")),
+        '{"id": "truncated", "height": 1',
+        json.dumps(dict(PROFILE, id="b")),
+        json.dumps(["not", "an", "object"]),
+    ]) + "\n")
+
+    summary = run_batch(str(input_path), str(output_path), gateway, workers=2)
+
+    records = read_records(output_path)
+    assert summary["ok"] == 2 and summary["error"] == 3
+    assert records["a"]["status"] == records["b"]["status"] == "ok"
+    assert records["bad-height"]["status"] == "error"
+    assert "ValueError" in records["bad-height"]["error"]
+    assert records["2"]["status"] == records["4"]["status"] == "error"
+
+
+def test_rerun_skips_completed_rows_and_retries_bad_ones(tmp_path, gateway):
+    input_path, output_path = tmp_path / "profiles.jsonl", tmp_path / "plans.jsonl"
+    input_path.write_text(json.dumps(dict(PROFILE, id="a")) + "\n" + json.dumps(dict(PROFILE, id="x", height="x")) + "\n")
+    run_batch(str(input_path), str(output_path), gateway, workers=2)
+
+    summary = run_batch(str(input_path), str(output_path), gateway, workers=2)
+
+    assert summary["skipped"] == 1 and summary["error"] == 1
+
+
+def test_rows_in_flight_are_written_when_reading_fails(tmp_path, monkeypatch, gateway):
+    output_path = tmp_path / "plans.jsonl"
+
+    def failing_rows(path):
+        yield dict(PROFILE, id="a")
+        yield dict(PROFILE, id="b")
+        raise OSError("input disappeared")
+
+    monkeypatch.setattr("batch_generate.read_rows", failing_rows)
+    with pytest.raises(OSError):
+        run_batch("profiles.jsonl", str(output_path), gateway, workers=4)
+
+    assert set(read_records(output_path)) == {"a", "b"}
@@ -0,0 +1,39 @@
+import benchmark
+from llm_backends import MockBackend, RecordingBackend, create_backend, prompt_fingerprint
+
+
+class ReplayCheckingBackend(MockBackend):
+    """
+    A mock that notes every prompt it has no recording for.
+    """
+
+    def __init__(self, recording_path):
+        super().__init__(recording_path=recording_path, latency=0, tokens_per_second=1e6)
+        self.misses = []
+
+    def _respond(self, prompt, model):
+        if prompt_fingerprint(prompt, model) not in self.recordings:
+            self.misses.append(prompt)
+        return super()._respond(prompt, model)
+
+
+def test_benchmark_sessions_replay_from_a_recording(tmp_path, make_gateway):
+    path = str(tmp_path / "responses.jsonl")
+    recorded = MockBackend(latency=0, tokens_per_second=1e6, responses={"chat": "A recorded reply."})
+    benchmark.run_session(0, make_gateway(RecordingBackend(recorded, path)), turns=2, stream=False)
+
+    replay = ReplayCheckingBackend(path)
+    benchmark.run_session(0, make_gateway(replay), turns=2, stream=False)
+
+    assert replay.prompt_log
+    assert replay.misses == []
+
+
+def test_recording_path_is_read_from_the_environment(tmp_path, monkeypatch):
+    path = str(tmp_path / "responses.jsonl")
+    RecordingBackend(MockBackend(latency=0), path).generate("Hello", "command", 10, 0.0)
+    monkeypatch.setenv("LLM_RECORDING_PATH", path)
+
+    backend = create_backend("mock")
+
+    assert prompt_fingerprint("Hello", "command") in backend.recordings
@@ -0,0 +1,65 @@
+from meal_plan import parse_meal_plan
+
+STRICT = (
+    '{"days": [{"day": "Day 1", "meals": {"Breakfast": {"items": ["Oatmeal", "Berries"], "calories": 350}, '
+    '"Lunch": {"items": ["Lentil soup"], "calories": 450}, "Dinner": {"items": ["Tofu stir-fry"], "calories": 600}}, '
+    '"total_calories": 1400}]}'
+)
+
+
+def meals(plan, day=0):
+    return {slot: meal.items for slot, meal in plan.days[day].meals.items()}
+
+
+def test_strict_json():
+    plan = parse_meal_plan(STRICT)
+    assert meals(plan) == {"Breakfast": ["Oatmeal", "Berries"], "Lunch": ["Lentil soup"], "Dinner": ["Tofu stir-fry"]}
+    assert plan.days[0].total_calories == 1400
+
+
+def test_code_fences():
+    plan = parse_meal_plan(f"Here is your plan:\n```json\n{STRICT}\n```\nEnjoy!")
+    assert meals(plan) == meals(parse_meal_plan(STRICT))
+
+
+def test_trailing_commas():
+    plan = parse_meal_plan('{"Day 1": {"Breakfast": "Oatmeal (300 kcal)", "Dinner": "Salmon, rice (650 kcal)",},}')
+    assert meals(plan) == {"Breakfast": ["Oatmeal"], "Dinner": ["Salmon", "rice"]}
+    assert plan.days[0].total_calories == 950
+
+
+def test_single_quotes():
+    plan = parse_meal_plan("{'Day 1': {'Breakfast': \"Greek yogurt, berries\", 'Lunch': 'Chicken wrap', "
+                           "'Total Daily Calories': '1,650 kcal'}}")
+    assert meals(plan) == {"Breakfast": ["Greek yogurt", "berries"], "Lunch": ["Chicken wrap"]}
+    assert plan.days[0].total_calories == 1650
+
+
+def test_duplicate_snack_keys():
+    plan = parse_meal_plan('{"Day 1": {"Breakfast": "Oatmeal", "Snack": "Apple", "Lunch": "Soup", '
+                           '"Snack": "Nuts", "Dinner": "Fish"}}')
+    assert meals(plan) == {"Breakfast": ["Oatmeal"], "Morning Snack": ["Apple"], "Lunch": ["Soup"],
+                           "Afternoon Snack": ["Nuts"], "Dinner": ["Fish"]}
+
+
+def test_single_quotes_with_duplicate_snack_keys():
+    plan = parse_meal_plan("{'Day 1': {'Breakfast': 'Oatmeal', 'Snack': 'Apple', 'Lunch': 'Soup', "
+                           "'Snack': 'Nuts', 'Dinner': 'Fish',}}")
+    assert meals(plan)["Morning Snack"] == ["Apple"]
+    assert meals(plan)["Afternoon Snack"] == ["Nuts"]
+
+
+def test_plain_text():
+    plan = parse_meal_plan(
+        "Day 1:\n- Breakfast: Oatmeal with berries (350 kcal)\n- Snack: Yogurt\n- Lunch: Lentil soup\n"
+        "Total calories: 1,200\n\nTuesday\nBreakfast - Eggs and toast\nDinner: Tofu stir-fry"
+    )
+    assert [day.label for day in plan.days] == ["Day 1", "Tuesday"]
+    assert meals(plan) == {"Breakfast": ["Oatmeal with berries"], "Morning Snack": ["Yogurt"], "Lunch": ["Lentil soup"]}
+    assert plan.days[0].meals["Breakfast"].calories == 350
+    assert plan.days[0].total_calories == 1200
+    assert meals(plan, 1) == {"Breakfast": ["Eggs", "toast"], "Dinner": ["Tofu stir-fry"]}
+
+
+def test_unparseable_text():
+    assert parse_meal_plan("Sure, I can help with that.") is None
@@ -0,0 +1,70 @@
+import pytest
+
+from nutrition import DietScreener, PatternMatcher, load_nutrition_db
+
+
+@pytest.fixture(scope="module")
+def db():
+    return load_nutrition_db()
+
+
+def found(matcher, text):
+    return [term for _, _, term, _ in matcher.find(text)]
+
+
+def test_matcher_prefers_leftmost_longest():
+    matcher = PatternMatcher([("peanut", 1), ("peanut butter", 2), ("butter", 3)])
+    assert found(matcher, "Toast with peanut butter and butter") == ["peanut butter", "butter"]
+
+
+def test_matcher_respects_word_boundaries():
+    matcher = PatternMatcher([("egg", 1), ("nut", 2)])
+    assert found(matcher, "Eggplant with coconut") == []
+    assert found(matcher, "egg, nut.") == ["egg", "nut"]
+
+
+def test_matcher_allows_plurals():
+    matcher = PatternMatcher([("peanut", 1), ("peach", 2)])
+    assert found(matcher, "Peanuts and peaches") == ["peanut", "peach"]
+    assert found(matcher, "peanutsy") == []
+
+
+def test_matcher_reports_positions_and_payloads():
+    assert PatternMatcher([("kiwi", "fruit")]).find("Sliced kiwi") == [(7, 11, "kiwi", "fruit")]
+
+
+@pytest.mark.parametrize("allergies", [
+    "Peanuts.",
+    "severe peanut allergy",
+    "I'm allergic to peanuts",
+    "shellfish & peanuts",
+    "peanuts (anaphylaxis)",
+    "Allergic to: nuts",
+])
+def test_peanut_allergy_wording(db, allergies):
+    screener = DietScreener(db, allergies)
+    assert "peanut" in screener.forbidden_tags
+    assert [term for term, _ in screener.screen_text("Apple with peanut butter")] == ["peanut butter"]
+
+
+def test_every_allergen_in_an_entry_counts(db):
+    screener = DietScreener(db, "shellfish & peanuts, lactose intolerant")
+    assert {"shellfish", "peanut", "dairy"} <= screener.forbidden_tags.keys()
+
+
+def test_unknown_foods_become_custom_terms(db):
+    screener = DietScreener(db, "severe kiwi allergy")
+    assert screener.forbidden_tags == {}
+    assert screener.screen_text("Yogurt with kiwis") == [("kiwi", "allergy: kiwi")]
+
+
+@pytest.mark.parametrize("allergies", ["", "none", "None.", "n/a"])
+def test_no_allergies(db, allergies):
+    screener = DietScreener(db, allergies)
+    assert screener.forbidden_tags == {} and screener.custom_matcher is None
+
+
+def test_restrictions(db):
+    screener = DietScreener(db, dietary_restrictions="Vegetarian")
+    assert [term for term, _ in screener.screen_text("Grilled chicken salad")] == ["grilled chicken"]
+    assert screener.screen_text("Lentil soup") == []
@@ -0,0 +1,27 @@
+import pytest
+
+from planner import disliked_ingredients
+
+
+@pytest.mark.parametrize("preferences, expected", [
+    ("likes lentils, dislikes mushrooms and olives", ["mushrooms", "olives"]),
+    ("Hates red meat please", ["red meat"]),
+    ("not a fan of tofu", ["tofu"]),
+    ("Not a big fan of eggplant or zucchini; loves pasta", ["eggplant", "zucchini"]),
+    ("I don't like spicy food because of reflux", ["spicy food"]),
+    ("avoids dairy but likes cheese", ["dairy"]),
+    ("dislikes cilantro. Likes rice", ["cilantro"]),
+    ("dislikes beets, hates beets", ["beets"]),
+])
+def test_disliked_ingredients(preferences, expected):
+    assert disliked_ingredients(preferences) == expected
+
+
+@pytest.mark.parametrize("preferences", ["no preference", "not picky", "likes everything", "", None])
+def test_no_dislikes(preferences):
+    assert disliked_ingredients(preferences) == []
+
+
+def test_disliked_ingredients_are_short():
+    terms = disliked_ingredients("can't stand anything with lots of heavy cream sauce on top")
+    assert terms and all(len(term.split()) <= 3 for term in terms)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from progress_charts import lttb_indices, minmax_indices
+
+
+@pytest.mark.parametrize("n", [4, 5, 10, 101, 1000])
+@pytest.mark.parametrize("max_points", [1, 2, 3, 4, 5, 6, 7, 50])
+def test_downsampling_stays_within_budget(n, max_points):
+    y = np.sin(np.arange(n) / 3.0)
+    for keep in (minmax_indices(y, max_points), lttb_indices(np.arange(n), y, max_points)):
+        assert len(keep) <= max(max_points, 1)
+        assert np.all(np.diff(keep) > 0) and keep[0] >= 0 and keep[-1] < n
+
+
+def test_short_series_are_kept_whole():
+    y = np.arange(5.0)
+    assert list(minmax_indices(y, 5)) == list(range(5))
+    assert list(lttb_indices(np.arange(5), y, 10)) == list(range(5))
+
+
+def test_minmax_keeps_endpoints_and_extremes():
+    y = np.zeros(100)
+    y[37], y[81] = 9.0, -9.0
+    keep = minmax_indices(y, 10)
+    assert {0, 37, 81, 99} <= set(keep)
@@ -0,0 +1,32 @@
+import pytest
+
+from progress_store import ProgressStore
+
+MEASUREMENT = {
+    "timestamp": "2024-01-01 08:00:00", "height": 170, "current_weight": 70,
+    "waist_circumference": 80, "hip_circumference": 95,
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProgressStore(str(tmp_path / "progress.sqlite3"))
+
+
+def test_summary_tracks_first_and_latest(store):
+    store.add_many("user", [MEASUREMENT, dict(MEASUREMENT, timestamp="2024-02-01", current_weight=68)])
+    summary = store.summary("user")
+    assert summary["measurements"] == 2
+    assert summary["delta"]["current_weight"] == -2
+    assert summary["latest"]["BMI"] == pytest.approx(68 / 1.7 ** 2)
+
+
+@pytest.mark.parametrize("field, value", [
+    ("height", 0), ("height", "-170"), ("current_weight", "nan"), ("waist_circumference", "inf"),
+    ("hip_circumference", ""),
+])
+def test_invalid_measurements_are_rejected(store, field, value):
+    with pytest.raises(ValueError):
+        store.add_many("user", [MEASUREMENT, dict(MEASUREMENT, **{field: value})])
+    # The whole import is rejected, so no partial history is stored
+    assert store.summary("user") is None
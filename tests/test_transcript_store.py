@@ -0,0 +1,55 @@
+import planner
+from chat_context import ChatContext
+from transcript_store import TranscriptStore
+
+
+def make_store(tmp_path, **kwargs):
+    return TranscriptStore(db_path=str(tmp_path / "transcripts.sqlite3"), **kwargs)
+
+
+def make_messages(count):
+    return [{"role": "user" if i % 2 else "assistant", "message": f"message {i}"} for i in range(count)]
+
+
+def test_spilled_messages_are_read_back_in_order(tmp_path):
+    store = make_store(tmp_path, memory_messages=4)
+    messages = make_messages(30)
+    transcript = store.transcript("session", "meal", messages)
+
+    assert transcript.footprint()["memory_messages"] == 4
+    assert transcript.footprint()["disk_messages"] == 26
+    assert list(transcript) == messages
+    assert transcript[3:12] == messages[3:12]
+    assert transcript[-1] == messages[-1]
+    assert transcript.extended([{"role": "user", "message": "new"}])[25:] == messages[25:] + [
+        {"role": "user", "message": "new"}
+    ]
+
+
+def test_session_budget_spills_early(tmp_path):
+    store = make_store(tmp_path, memory_messages=100, session_budget_bytes=2000)
+    transcript = store.transcript("session", "meal", make_messages(40))
+
+    footprint = store.session_footprint("session")
+    assert footprint["memory_bytes"] <= 2000
+    assert footprint["disk_messages"] > 0
+    assert footprint["disk_messages"] == transcript.footprint()["disk_messages"]
+    assert store.stats()["session"] == footprint["disk_messages"]
+
+
+def test_chat_turns_do_not_read_spilled_messages(tmp_path, gateway):
+    store = make_store(tmp_path, memory_messages=4)
+    transcript = store.transcript("session", "meal", make_messages(20))
+    context = ChatContext()
+    # The first turn builds the context from the whole history
+    planner.chat_meal_plan(transcript.extended([{"role": "user", "message": "hello"}]), {}, context, gateway)
+    loaded = store.stats()["loaded"]
+
+    for turn in range(10):
+        user_message = {"role": "user", "message": f"turn {turn}"}
+        reply = planner.chat_meal_plan(transcript.extended([user_message]), {}, context, gateway)
+        transcript.append(user_message)
+        transcript.append({"role": "assistant", "message": reply})
+
+    assert transcript.footprint()["disk_messages"] > 16
+    assert store.stats()["loaded"] == loaded
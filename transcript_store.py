@@ -0,0 +1,291 @@
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from collections import deque
+from collections.abc import Sequence
+
+# ----------------------------------------------------------------
+# Chat transcripts with a bounded in-memory window and compressed on-disk spill
+# ----------------------------------------------------------------
+
+# Spilled messages are read back in pages of this many rows when iterating
+READ_PAGE_SIZE = 50
+
+
+def _message_bytes(msg):
+    """
+    Approximates the memory held by one {"role", "message"} dict.
+    """
+    return sys.getsizeof(msg) + sum(sys.getsizeof(value) for value in msg.values())
+
+
+def approximate_size(obj, _seen=None):
+    """
+    Approximates the memory held by `obj` and everything it references through containers and
+    instance attributes. Transcripts count only their in-memory window.
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, Transcript):
+        return obj.footprint()["memory_bytes"]
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approximate_size(key, seen) + approximate_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(approximate_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += approximate_size(vars(obj), seen)
+    return size
+
+
+class Transcript(Sequence):
+    """
+    One conversation as a read-only sequence of {"role", "message"} dicts that can only be appended to.
+
+    Only the newest messages are kept in memory; older ones are spilled to the store's SQLite file
+    and read back when indexed or sliced, so rendering the latest page never touches the disk.
+    Create transcripts with TranscriptStore.transcript().
+    """
+
+    def __init__(self, store, session_id, chat):
+        self._store = store
+        self.session_id = session_id
+        self.chat = chat
+        self.id = next(store._ids)
+        self._hot = []
+        self._hot_start = 0  # index of the first in-memory message
+        self._hot_bytes = 0
+        self._disk_bytes = 0
+        self.last_access = time.monotonic()
+
+    def __len__(self):
+        return self._hot_start + len(self._hot)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._store._read(self, start, stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transcript index out of range")
+        return self._store._read(self, index, index + 1)[0]
+
+    def __iter__(self):
+        for start in range(0, len(self), READ_PAGE_SIZE):
+            yield from self[start:start + READ_PAGE_SIZE]
+
+    def __repr__(self):
+        return f"Transcript({self.session_id!r}, {self.chat!r}, {len(self)} messages)"
+
+    def append(self, msg):
+        self._store._append(self, msg)
+
+    def extended(self, messages):
+        """
+        Returns a view of this transcript followed by `messages`, without copying the history.
+        """
+        return _ExtendedTranscript(self, list(messages))
+
+    def footprint(self):
+        """
+        Returns message counts and approximate bytes held in memory and on disk (compressed).
+        """
+        with self._store._lock:
+            return {
+                "messages": len(self),
+                "memory_messages": len(self._hot),
+                "memory_bytes": self._hot_bytes,
+                "disk_messages": self._hot_start,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+class _ExtendedTranscript(Sequence):
+    """
+    A transcript plus pending messages that have not been committed to it yet.
+    """
+
+    def __init__(self, base, extra):
+        self._base = base
+        self._extra = extra
+
+    def __len__(self):
+        return len(self._base) + len(self._extra)
+
+    def __getitem__(self, index):
+        base_len = len(self._base)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            head = self._base[start:min(stop, base_len)] if start < base_len else []
+            return head + self._extra[max(start - base_len, 0):max(stop - base_len, 0)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transcript index out of range")
+        return self._base[index] if index < base_len else self._extra[index - base_len]
+
+
+class TranscriptStore:
+    """
+    Keeps every session's chat transcripts within memory caps by spilling older messages to disk.
+
+    Each transcript keeps at most `memory_messages` of its newest messages in memory. If a session's
+    transcripts together exceed `session_budget_bytes`, or all sessions exceed `global_budget_bytes`
+    (least recently used transcripts first), older messages are spilled early, down to
+    `min_memory_messages` per transcript. Spilled messages are stored as zlib-compressed JSON in a
+    per-process SQLite file that is cleared on start, and are deleted once their transcript is
+    garbage collected (i.e. its session has ended).
+    """
+
+    def __init__(self, db_path=None, memory_messages=20, min_memory_messages=2,
+                 session_budget_bytes=256 * 1024, global_budget_bytes=64 * 1024 * 1024, metrics=None):
+        self.db_path = db_path or os.path.join(tempfile.gettempdir(), f"transcripts-{os.getpid()}.sqlite3")
+        self.memory_messages = memory_messages
+        self.min_memory_messages = min_memory_messages
+        self.session_budget_bytes = session_budget_bytes
+        self.global_budget_bytes = global_budget_bytes
+        self.metrics = metrics
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._transcripts = weakref.WeakSet()
+        # Ids of collected transcripts; their rows are deleted on the next write rather than from the collector
+        self._dead = []
+        self._stats = {"spilled": 0, "loaded": 0, "window": 0, "session": 0, "global": 0}
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spilled_messages ("
+            " transcript_id INTEGER NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " message BLOB NOT NULL,"
+            " PRIMARY KEY (transcript_id, seq)) WITHOUT ROWID"
+        )
+        # Transcripts only live as long as the sessions of this process
+        self._conn.execute("DELETE FROM spilled_messages")
+        self._conn.commit()
+
+    def transcript(self, session_id, chat, messages=()):
+        """
+        Creates a transcript for one chat of one session, starting with `messages`.
+        """
+        transcript = Transcript(self, session_id, chat)
+        weakref.finalize(transcript, self._dead.append, transcript.id)
+        with self._lock:
+            self._transcripts.add(transcript)
+        for msg in messages:
+            transcript.append(msg)
+        return transcript
+
+    def _append(self, transcript, msg):
+        with self._lock:
+            transcript._hot.append(msg)
+            transcript._hot_bytes += _message_bytes(msg)
+            transcript.last_access = time.monotonic()
+            self._purge_dead()
+            overflow = len(transcript._hot) - self.memory_messages
+            if overflow > 0:
+                self._spill(transcript, overflow, "window")
+            self._enforce_budgets(transcript.session_id)
+            self._conn.commit()
+
+    def _read(self, transcript, start, stop):
+        with self._lock:
+            transcript.last_access = time.monotonic()
+            hot_start = transcript._hot_start
+            messages = []
+            if start < min(stop, hot_start):
+                rows = self._conn.execute(
+                    "SELECT message FROM spilled_messages WHERE transcript_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                    (transcript.id, start, min(stop, hot_start)),
+                ).fetchall()
+                messages = [json.loads(zlib.decompress(blob)) for (blob,) in rows]
+                self._stats["loaded"] += len(messages)
+            if stop > hot_start:
+                messages.extend(transcript._hot[max(start, hot_start) - hot_start:stop - hot_start])
+            return messages
+
+    def _spill(self, transcript, count, reason):
+        """
+        Moves the oldest `count` in-memory messages of `transcript` to disk. Must be called with the lock held.
+        """
+        spilled = transcript._hot[:count]
+        blobs = [zlib.compress(json.dumps(msg).encode("utf-8")) for msg in spilled]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO spilled_messages (transcript_id, seq, message) VALUES (?, ?, ?)",
+            [(transcript.id, transcript._hot_start + i, blob) for i, blob in enumerate(blobs)],
+        )
+        del transcript._hot[:count]
+        transcript._hot_start += count
+        transcript._hot_bytes -= sum(_message_bytes(msg) for msg in spilled)
+        transcript._disk_bytes += sum(len(blob) for blob in blobs)
+        self._stats["spilled"] += count
+        self._stats[reason] += count
+        if self.metrics is not None:
+            self.metrics.counter(
+                "transcript_spilled_messages_total", "Chat messages moved from memory to disk"
+            ).inc(count, reason=reason)
+
+    def _shrink(self, transcripts, excess, reason):
+        """
+        Spills messages from `transcripts`, in order, until `excess` bytes have been freed or every
+        transcript is down to its minimum window. Must be called with the lock held.
+        """
+        for transcript in transcripts:
+            while excess > 0 and len(transcript._hot) > self.min_memory_messages:
+                freed = transcript._hot_bytes
+                self._spill(transcript, 1, reason)
+                excess -= freed - transcript._hot_bytes
+            if excess <= 0:
+                break
+
+    def _enforce_budgets(self, session_id):
+        transcripts = sorted(self._transcripts, key=lambda t: t.last_access)
+        session = [t for t in transcripts if t.session_id == session_id]
+        session_excess = sum(t._hot_bytes for t in session) - self.session_budget_bytes
+        if session_excess > 0:
+            self._shrink(session, session_excess, "session")
+        global_excess = sum(t._hot_bytes for t in transcripts) - self.global_budget_bytes
+        if global_excess > 0:
+            self._shrink(transcripts, global_excess, "global")
+
+    def _purge_dead(self):
+        while self._dead:
+            self._conn.execute("DELETE FROM spilled_messages WHERE transcript_id = ?", (self._dead.pop(),))
+
+    def session_footprint(self, session_id):
+        """
+        Returns the combined footprint of one session's transcripts (see Transcript.footprint).
+        """
+        with self._lock:
+            footprints = [t.footprint() for t in self._transcripts if t.session_id == session_id]
+        totals = {"messages": 0, "memory_messages": 0, "memory_bytes": 0, "disk_messages": 0, "disk_bytes": 0}
+        for footprint in footprints:
+            for key in totals:
+                totals[key] += footprint[key]
+        return totals
+
+    def stats(self):
+        """
+        Returns global memory and disk usage, spill counts by reason and messages read back from disk.
+        """
+        with self._lock:
+            transcripts = list(self._transcripts)
+            stats = dict(self._stats)
+            stats["sessions"] = len({t.session_id for t in transcripts})
+            stats["transcripts"] = len(transcripts)
+            stats["memory_bytes"] = sum(t._hot_bytes for t in transcripts)
+            stats["disk_bytes"] = sum(t._disk_bytes for t in transcripts)
+        return stats